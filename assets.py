@@ -0,0 +1,216 @@
+import hashlib
+import os
+import struct
+
+import pygame
+
+BLACK = (0, 0, 0)
+
+# Player Sprite Rects in qubic.png
+SPRITE_RECTS = [
+    (4, 3, 14, 17),  # 0 - standing
+    (18, 3, 14, 17),  # 1 - walk 1
+    (32, 3, 14, 17),  # 2 - walk 2
+    (46, 3, 14, 17),  # 3 - walk 3
+    (16, 22, 16, 13),  # 4 - death
+]
+
+SPRITE_COLORKEY = (255, 255, 255)  # Background of the player sheet
+
+TILE_FILES = {
+    "t": "grass-top.png",
+    "g": "grass-under.png",
+    "s": "spike1.png",
+    "d": "spike2.png",
+    "f": "spike3.png",
+    "e": "spike4.png",
+    "w": "cuboc.png",
+    "p": "grass-top.png",
+}
+
+TITLE_SCREEN = "TITLE SCREEN.png"
+END_SCREEN = "END_SCREEN.png"
+
+# Pre-scaled surfaces live here, one folder per display resolution
+ASSET_CACHE_DIR = "asset_cache"
+CACHE_MAGIC = b"IWKA"
+# magic, has alpha, width, height
+CACHE_HEADER = struct.Struct("<4sBxxxII")
+
+
+class SpriteSheet:
+    def __init__(self, filename):
+        try:
+            self.sheet = pygame.image.load(filename).convert_alpha()
+        except pygame.error as message:
+            print("Unable to load spritesheet image:", filename)
+            raise SystemExit(message)
+
+    def image_at(self, rectangle, colorkey=None):
+        rect = pygame.Rect(rectangle)
+        image = pygame.Surface(rect.size, pygame.SRCALPHA).convert_alpha()
+        image.blit(self.sheet, (0, 0), rect)
+        if colorkey is not None:
+            if colorkey == -1:
+                colorkey = image.get_at((0, 0))
+            image.set_colorkey(colorkey, pygame.RLEACCEL)
+        return image
+
+    def images_at(self, rects, colorkey=None):
+        return [self.image_at(rects, colorkey) for rects in rects]
+
+
+# Cached pixels carry no colorkey, so pixels of the key color become fully transparent instead
+def bake_colorkey(surface):
+    colorkey = surface.get_colorkey()[:3]
+    baked = surface.copy()
+    baked.set_colorkey(None)
+    for y in range(baked.get_height()):
+        for x in range(baked.get_width()):
+            if baked.get_at((x, y))[:3] == colorkey:
+                baked.set_at((x, y), (0, 0, 0, 0))
+    return baked
+
+
+# Raw pixel dumps of already scaled surfaces. An entry is named after its size and the
+# hash of its source file, so editing a PNG or a scale makes the old entry stale.
+class AssetDiskCache:
+    def __init__(self, directory=ASSET_CACHE_DIR):
+        self.directory = directory
+        self.digests = {}
+
+    def file_digest(self, filename):
+        digest = self.digests.get(filename)
+        if digest is None:
+            with open(filename, "rb") as file:
+                digest = hashlib.sha1(file.read()).hexdigest()[:16]
+            self.digests[filename] = digest
+        return digest
+
+    def load(self, key, filename, resolution, size, build, alpha=True):
+        try:
+            digest = self.file_digest(filename)
+        except OSError:
+            return build()  # Missing source, let build() report it
+        folder = os.path.join(self.directory, f"{int(resolution[0])}x{int(resolution[1])}")
+        path = os.path.join(folder, f"{key}-{int(size[0])}x{int(size[1])}-{digest}.bin")
+        surface = self.read(path, alpha, size)
+        if surface is None:
+            surface = build()
+            self.write(folder, key, path, surface, alpha)
+        return surface
+
+    def read(self, path, alpha, size):
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            magic, has_alpha, width, height = CACHE_HEADER.unpack_from(data)
+            if magic != CACHE_MAGIC or has_alpha != alpha or (width, height) != (int(size[0]), int(size[1])):
+                return None
+            pixels = data[CACHE_HEADER.size:]
+            if alpha:
+                return pygame.image.frombytes(pixels, (width, height), "RGBA").convert_alpha()
+            return pygame.image.frombytes(pixels, (width, height), "RGB").convert()
+        except (OSError, ValueError, struct.error, pygame.error):
+            return None
+
+    def write(self, folder, key, path, surface, alpha):
+        header = CACHE_HEADER.pack(CACHE_MAGIC, alpha, surface.get_width(), surface.get_height())
+        if alpha and surface.get_colorkey() is not None:
+            surface = bake_colorkey(surface)
+        pixels = pygame.image.tobytes(surface, "RGBA" if alpha else "RGB")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # Drop entries built from an older version of the source file
+            for name in os.listdir(folder):
+                if name.startswith(key + "-") and name.endswith(".bin"):
+                    os.remove(os.path.join(folder, name))
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as file:
+                file.write(header)
+                file.write(pixels)
+            os.replace(temp_path, path)  # A killed game never leaves half a file behind
+        except OSError as e:
+            print(f"Error writing asset cache: {e}")
+
+
+# Owns every image the game draws. Each surface is built once per resolution
+# and handed out from the cache afterwards, so the main loop never touches the disk.
+class AssetManager:
+    def __init__(self, width, height, disk_cache=None):
+        self.resolution = None
+        self.disk_cache = disk_cache
+        self.set_resolution(width, height)
+
+    def set_resolution(self, width, height):
+        if self.resolution == (width, height):
+            return
+        self.resolution = (width, height)
+        self.tile_size = width / 128
+        self.scale_factor = width / 1024
+        self.screen_images = {}
+        self.flipped_sprites = {}
+        self.sprites = self.load_sprites()
+        self.tile_images = self.load_tile_images()
+        self.cursor_image = self.load_cursor()
+
+    # Build a surface of the given size, or read it from the disk cache when there is one
+    def cached(self, key, filename, size, build, alpha=True):
+        if self.disk_cache is None:
+            return build()
+        return self.disk_cache.load(key, filename, self.resolution, size, build, alpha)
+
+    def load_sprites(self):
+        spritesheet = []  # The sheet is only decoded when a frame is not cached
+        size = (int(14 * self.scale_factor), int(17 * self.scale_factor))
+
+        def build_sprite(rect):
+            if not spritesheet:
+                spritesheet.append(SpriteSheet("qubic.png"))
+            return pygame.transform.scale(spritesheet[0].image_at(rect, colorkey=SPRITE_COLORKEY), size)
+
+        return [self.cached(f"sprite{index}", "qubic.png", size, lambda rect=rect: build_sprite(rect))
+                for index, rect in enumerate(SPRITE_RECTS)]
+
+    def load_tile_images(self):
+        scaled = {}  # grass-top.png is used by two tile types, load it only once
+        tile_images = {}
+        size = (int(self.tile_size), int(self.tile_size))
+        for tile, filename in TILE_FILES.items():
+            if filename not in scaled:
+                scaled[filename] = self.cached(
+                    os.path.splitext(filename)[0], filename, size,
+                    lambda filename=filename: pygame.transform.scale(
+                        pygame.image.load(filename).convert_alpha(), size))
+            tile_images[tile] = scaled[filename]
+        tile_images["."] = None
+        return tile_images
+
+    def load_cursor(self):
+        try:
+            size = (12, 19)  # Keep aspect ratio
+            return self.cached("cursor", "cursor.png", size, lambda: pygame.transform.scale(
+                pygame.image.load("cursor.png").convert_alpha(), size))
+        except pygame.error as e:
+            print(f"Error loading cursor image: {e}")
+            cursor_image = pygame.Surface((10, 10))  # Default black square
+            cursor_image.fill(BLACK)
+            return cursor_image
+
+    # Full screen images (title and end screen), decoded on first use only
+    def screen_image(self, filename):
+        image = self.screen_images.get(filename)
+        if image is None:
+            image = self.cached(
+                os.path.splitext(filename)[0].replace(" ", "_"), filename, self.resolution,
+                lambda: pygame.transform.scale(pygame.image.load(filename).convert(), self.resolution), alpha=False)
+            self.screen_images[filename] = image
+        return image
+
+    # Mirrored player frames used while facing left
+    def flipped_sprite(self, index):
+        image = self.flipped_sprites.get(index)
+        if image is None:
+            image = pygame.transform.flip(self.sprites[index], True, False)
+            self.flipped_sprites[index] = image
+        return image
@@ -0,0 +1,114 @@
+import os
+
+import pygame
+
+# Every sound and track is opened once. Effects and short tracks are decoded into Sounds and kept,
+# long tracks are streamed through pygame.mixer.music and only reopened when another long track played.
+# Cached tracks play on two reserved channels so one can fade out while the next fades in, a stream
+# only fades in.
+
+VOLUME = 0.5
+CROSSFADE_MS = 300
+SHORT_TRACK_FILE_BYTES = 512 * 1024  # Bigger compressed files are streamed instead of decoded
+MEMORY_BUDGET = 16 * 1024 * 1024  # Bytes of decoded audio the bank may hold
+MUSIC_CHANNELS = 2  # Reserved for cached tracks, effects never take them
+
+
+# Bytes a decoded Sound takes at the mixer format
+def decoded_bytes(sound):
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+
+class AudioBank:
+    def __init__(self, volume=VOLUME, memory_budget=MEMORY_BUDGET, crossfade_ms=CROSSFADE_MS):
+        self.volume = volume
+        self.memory_budget = memory_budget
+        self.crossfade_ms = crossfade_ms
+        self.sounds = {}  # file -> Sound, effects
+        self.tracks = {}  # file -> Sound, short tracks
+        self.streamed = set()  # Tracks that go through pygame.mixer.music
+        self.memory_bytes = 0
+        pygame.mixer.set_reserved(MUSIC_CHANNELS)
+        self.music_channels = [pygame.mixer.Channel(index) for index in range(MUSIC_CHANNELS)]
+        self.channel = None  # Music channel of the playing cached track, None while streaming
+        self.loaded_stream = None  # Track currently opened by pygame.mixer.music
+        self.current = None
+
+    # Decode effects up front, raises pygame.error for files that cannot be played
+    def preload_sounds(self, sound_files):
+        for sound_file in sound_files:
+            if sound_file not in self.sounds:
+                sound = pygame.mixer.Sound(sound_file)
+                sound.set_volume(self.volume)
+                self.sounds[sound_file] = sound
+                self.memory_bytes += decoded_bytes(sound)
+
+    # Short tracks are decoded while they fit into the budget, the rest is streamed
+    def preload_tracks(self, track_files):
+        for track_file in track_files:
+            if track_file in self.tracks or track_file in self.streamed:
+                continue
+            if os.path.getsize(track_file) <= SHORT_TRACK_FILE_BYTES:
+                sound = pygame.mixer.Sound(track_file)
+                size = decoded_bytes(sound)
+                if self.memory_bytes + size <= self.memory_budget:
+                    self.tracks[track_file] = sound
+                    self.memory_bytes += size
+                    continue
+            self.streamed.add(track_file)
+        # Open the first streamed track now, so a broken file shows up at startup
+        for track_file in track_files:
+            if track_file in self.streamed:
+                self.open_stream(track_file)
+                break
+
+    def open_stream(self, track_file):
+        if self.loaded_stream != track_file:
+            pygame.mixer.music.load(track_file)
+            self.loaded_stream = track_file
+
+    def play_sound(self, sound_file):
+        sound = self.sounds.get(sound_file)
+        if sound is None:
+            self.preload_sounds([sound_file])
+            sound = self.sounds[sound_file]
+        sound.play()
+
+    # Start a track from the beginning, the playing one fades out. loops=-1 repeats forever.
+    def play_music(self, track_file, loops=-1):
+        if track_file not in self.tracks and track_file not in self.streamed:
+            self.preload_tracks([track_file])
+        self.stop_music()
+        sound = self.tracks.get(track_file)
+        if sound is not None:
+            # The other channel may still be fading out the previous track
+            channel = self.music_channels[1] if self.channel is self.music_channels[0] else self.music_channels[0]
+            channel.set_volume(self.volume)
+            channel.play(sound, loops, fade_ms=self.crossfade_ms)
+            self.channel = channel
+        else:
+            # One stream only. SDL_mixer lets a fading stream finish before it opens or starts
+            # the next one, which stalls the frame, so the old stream is cut off right away.
+            pygame.mixer.music.stop()
+            self.open_stream(track_file)
+            pygame.mixer.music.set_volume(self.volume)
+            pygame.mixer.music.play(loops, fade_ms=self.crossfade_ms)
+            self.channel = None
+        self.current = track_file
+
+    def stop_music(self, fade_ms=None):
+        if fade_ms is None:
+            fade_ms = self.crossfade_ms
+        if self.current is None:
+            return
+        if self.channel is not None:
+            if fade_ms:
+                self.channel.fadeout(fade_ms)
+            else:
+                self.channel.stop()
+        elif fade_ms:
+            pygame.mixer.music.fadeout(fade_ms)
+        else:
+            pygame.mixer.music.stop()
+        self.current = None
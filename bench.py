@@ -0,0 +1,215 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+
+import pygame
+
+import core
+import profiler
+from assets import AssetManager
+from renderer import Renderer, build_level_layer, draw_game
+
+# Frame times of every level under the same scripted input, one frame per tick,
+# drawn at the base resolution into a window of the dummy video driver.
+# "python bench.py --output bench.json" from the dist folder, then later
+# "python bench.py --compare bench.json" to see what got slower.
+
+# 2: event pump and flip timed apart from input and render, 3: game events apart from the pump,
+# 4: frame times of drawn frames only
+BENCH_VERSION = 4
+WIDTH = core.SCREEN_COLUMNS * core.BASE_TILE_SIZE
+HEIGHT = WIDTH // 2
+TICKS = 30 * core.SIMULATION_RATE
+REPEAT = 3  # Runs per level, the fastest one counts
+THRESHOLD = 0.1  # A metric more than 10% slower than the baseline is a regression
+MIN_DIFFERENCE = 2.0  # Microseconds, smaller changes are timer noise
+
+# Buttons held for a number of ticks, played in a loop
+SCRIPT = [
+    (45, [core.RIGHT]),
+    (12, [core.RIGHT, core.JUMP]),
+    (30, [core.RIGHT]),
+    (10, []),
+    (40, [core.LEFT]),
+    (12, [core.LEFT, core.JUMP]),
+    (20, []),
+]
+MOUSE_TICKS = 30  # The mouse moves this often, the cursor never gets angry and ends the run
+
+LEVEL_FILE = re.compile(r"level(-?\d+)\.txt$")
+
+
+# Inputs of every tick for the script above, the same on every run
+def scripted_inputs():
+    held = []
+    tick = 0
+    while True:
+        for ticks, buttons in SCRIPT:
+            changes = [(core.RELEASE, button) for button in held if button not in buttons]
+            changes += [(core.PRESS, button) for button in buttons if button not in held]
+            held = buttons
+            for _ in range(ticks):
+                mouse = None
+                if tick % MOUSE_TICKS == 0:
+                    mouse = (WIDTH // 2 + tick // MOUSE_TICKS % 2, HEIGHT // 2)
+                yield core.Inputs(changes, mouse)
+                changes = []
+                tick += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+# Play one level for a number of ticks. A game that quits (the level was finished) starts over.
+def run_level(level_index, ticks, assets, renderer, folder="."):
+    def load_level(filename):
+        built = core.build_level(os.path.join(folder, filename), core.BASE_TILE_SIZE, assets.tile_images["t"])
+        built.layer = build_level_layer(built.tilemap, assets.tile_images, WIDTH, HEIGHT)
+        return built
+
+    def new_game():
+        game = core.Game(level_index, core.BASE_TILE_SIZE, load_level, (WIDTH // 2, HEIGHT // 2),
+                         assets.cursor_image.get_size())
+        game.phase_timer = timer
+        renderer.set_background(game.built.layer)
+        return game
+
+    timer = profiler.PhaseTimer()
+    game = new_game()
+    inputs = scripted_inputs()
+    frame_times = []
+    for _ in range(ticks):
+        if not game.running:
+            game = new_game()
+        start = time.perf_counter()
+        events = game.step(next(inputs))
+        timer.start(profiler.EVENT_PUMP)
+        pygame.event.pump()
+        timer.start(profiler.GAME_EVENTS)
+        for event, value in events:
+            if event == core.LEVEL_LOADED:
+                renderer.set_background(game.built.layer)
+        timer.start(profiler.RENDER)
+        drawn = game.state == core.PLAYING
+        if drawn:
+            draw_game(renderer, game, assets, 1.0, game.mouse_position)
+            timer.start(profiler.FLIP)
+            renderer.end_frame()
+        else:
+            timer.start(profiler.FLIP)
+            pygame.display.flip()
+        timer.stop()
+        # Frozen frames (respawn, level complete) only flip, they would hide slower drawn frames
+        if drawn:
+            frame_times.append(time.perf_counter() - start)
+
+    totals = timer.results()
+    return {
+        "ticks": ticks,
+        "phases": {phase: totals.get(phase, {"seconds": 0.0})["seconds"] / ticks * 1e6 for phase in profiler.PHASES},
+        "drawn_frames": len(frame_times),
+        "frame": {
+            "mean": sum(frame_times) / max(len(frame_times), 1) * 1e6,
+            "p50": percentile(frame_times, 0.5) * 1e6,
+            "p95": percentile(frame_times, 0.95) * 1e6,
+            "p99": percentile(frame_times, 0.99) * 1e6,
+        },
+    }
+
+
+# Microseconds per tick of every phase and frame time percentiles, per level.
+# Of several runs the fastest value of each metric is kept.
+def run(level_indices, ticks=TICKS, repeat=REPEAT, folder="."):
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    assets = AssetManager(WIDTH, HEIGHT)
+    results = {}
+    for level_index in level_indices:
+        best = None
+        for _ in range(repeat):
+            result = run_level(level_index, ticks, assets, Renderer(screen, dirty_rects=True), folder)
+            if best is None:
+                best = result
+            for group in ("phases", "frame"):
+                for name, value in result[group].items():
+                    best[group][name] = min(best[group][name], value)
+        results[f"level{level_index}"] = best
+    return {
+        "version": BENCH_VERSION,
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "ticks": ticks,
+        "repeat": repeat,
+        "levels": results,
+    }
+
+
+# Metrics slower than the baseline by more than threshold, as (level, metric, baseline, current)
+def compare(baseline, current, threshold=THRESHOLD):
+    regressions = []
+    for level, result in current["levels"].items():
+        base = baseline["levels"].get(level)
+        if base is None:
+            continue
+        for group in ("phases", "frame"):
+            for name, value in result[group].items():
+                before = base[group].get(name)
+                if before is not None and value > before * (1 + threshold) and value - before > MIN_DIFFERENCE:
+                    regressions.append((level, f"{group}.{name}", before, value))
+    return regressions
+
+
+def level_indices_in(folder):
+    matches = [LEVEL_FILE.match(name) for name in os.listdir(folder)]
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every part of a frame on each level.")
+    parser.add_argument("levels", nargs="*", type=int, help="level numbers, every levelN.txt by default")
+    parser.add_argument("--ticks", type=int, default=TICKS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--folder", default=".", help="folder with the levels and images")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.1 is 10%%")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_file = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(args.folder)  # Images are loaded from the current folder
+    pygame.init()
+    results = run(args.levels or level_indices_in("."), args.ticks, args.repeat)
+    print("level      " + "".join(f"{phase:>12}" for phase in profiler.PHASES) + f"{'frame p50':>12}{'frame p95':>12}")
+    for level, result in results["levels"].items():
+        print(f"{level:<11}" + "".join(f"{result['phases'][phase]:>10.1f}us" for phase in profiler.PHASES)
+              + f"{result['frame']['p50']:>10.1f}us{result['frame']['p95']:>10.1f}us")
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if baseline_file:
+        with open(baseline_file) as file:
+            baseline = json.load(file)
+        if baseline.get("version") != BENCH_VERSION:
+            print(f"Baseline is of bench version {baseline.get('version')}, phases that changed are not compared")
+        regressions = compare(baseline, results, args.threshold)
+        for level, metric, before, after in regressions:
+            print(f"{level} {metric}: {before:.1f}us -> {after:.1f}us (+{(after / before - 1) * 100:.0f}%)")
+        print(f"{len(regressions)} regressions over {args.threshold * 100:.0f}%")
+        pygame.quit()
+        sys.exit(1 if regressions else 0)
+    pygame.quit()
@@ -0,0 +1,72 @@
+# Uniform grid broadphase for the dynamic colliders (moving platforms, the angry cursor).
+# Entities re-insert themselves when they move, so a query only looks at the
+# entities registered in the cells around the query rect.
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.spans = {}  # entity -> (first column, first row, last column, last row)
+        self.order = {}  # entity -> insertion index, results come back in insertion order
+        self.next_order = 0
+
+    def span(self, rect):
+        return (int(rect.left // self.cell_size), int(rect.top // self.cell_size),
+                int((rect.right - 1) // self.cell_size), int((rect.bottom - 1) // self.cell_size))
+
+    def insert(self, entity, rect):
+        if entity in self.spans:
+            self.update(entity, rect)
+            return
+        self.order[entity] = self.next_order
+        self.next_order += 1
+        self.add_to_cells(entity, self.span(rect))
+
+    # Cheap when the entity stays inside the same cells, which is most frames
+    def update(self, entity, rect):
+        span = self.span(rect)
+        if self.spans.get(entity) == span:
+            return
+        self.remove_from_cells(entity)
+        self.add_to_cells(entity, span)
+
+    def remove(self, entity):
+        if entity in self.spans:
+            self.remove_from_cells(entity)
+            del self.order[entity]
+
+    def clear(self):
+        self.cells.clear()
+        self.spans.clear()
+        self.order.clear()
+        self.next_order = 0
+
+    def add_to_cells(self, entity, span):
+        first_column, first_row, last_column, last_row = span
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                self.cells.setdefault((column, row), set()).add(entity)
+        self.spans[entity] = span
+
+    def remove_from_cells(self, entity):
+        first_column, first_row, last_column, last_row = self.spans.pop(entity)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell = self.cells[(column, row)]
+                cell.discard(entity)
+                if not cell:
+                    del self.cells[(column, row)]
+
+    # Entities registered in the cells rect touches
+    def query(self, rect):
+        first_column, first_row, last_column, last_row = self.span(rect)
+        found = set()
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell = self.cells.get((column, row))
+                if cell:
+                    found.update(cell)
+        return sorted(found, key=self.order.__getitem__)
+
+    # Entities whose rect really overlaps rect
+    def collide(self, rect):
+        return [entity for entity in self.query(rect) if rect.colliderect(entity.rect)]
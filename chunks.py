@@ -0,0 +1,99 @@
+from concurrent.futures import wait
+
+import numpy as np
+import pygame
+
+from tilemap import tile_positions
+
+# Static tiles of a level larger than the screen, baked into square chunks instead of one huge
+# surface. Only the chunks around the camera exist: the ones coming into view are built on a
+# worker thread, the ones far behind are dropped. Memory and drawing cost follow the screen size.
+# Workers only blit, a chunk is converted to the display format on the main thread.
+
+CHUNK_TILES = 32  # Chunk side in tiles
+PREFETCH_CHUNKS = 1  # Chunks beyond the screen edge that are built ahead
+KEEP_CHUNKS = 2  # Chunks beyond the screen edge that stay built
+
+
+class ChunkedLayer:
+    def __init__(self, tilemap, tile_images, background, chunk_tiles=CHUNK_TILES, executor=None):
+        self.tilemap = tilemap
+        self.tile_images = tile_images
+        self.background = background
+        self.chunk_tiles = chunk_tiles
+        self.executor = executor  # Without one chunks are built when they are first drawn
+        self.columns = -(-tilemap.width // chunk_tiles)
+        self.rows = -(-tilemap.height // chunk_tiles)
+        self.chunk_size = tilemap.tile_size * chunk_tiles
+        self.chunks = {}  # (column, row) -> Surface
+        self.pending = {}  # (column, row) -> Future of a Surface
+
+    # Pixel rect of a chunk, its edges are the rounded edges of its tiles
+    def chunk_rect(self, key):
+        left, right = tile_positions(np.array([key[0], key[0] + 1]) * self.chunk_tiles, self.tilemap.tile_size)
+        top, bottom = tile_positions(np.array([key[1], key[1] + 1]) * self.chunk_tiles, self.tilemap.tile_size)
+        return pygame.Rect(int(left), int(top), int(right - left), int(bottom - top))
+
+    def build_chunk(self, key):
+        rect = self.chunk_rect(key)
+        chunk = pygame.Surface(rect.size)
+        chunk.fill(self.background)
+        column, row = key[0] * self.chunk_tiles, key[1] * self.chunk_tiles
+        region = (column, row, column + self.chunk_tiles, row + self.chunk_tiles)
+        chunk.blits(self.tilemap.blits(self.tile_images, region, rect.topleft), doreturn=False)
+        return chunk
+
+    # Chunk keys a pixel rect touches, widened by margin chunks and cut to the level
+    def keys_in(self, rect, margin=0):
+        first_column = max(int(rect.left // self.chunk_size) - margin, 0)
+        last_column = min(int((rect.right - 1) // self.chunk_size) + margin, self.columns - 1)
+        first_row = max(int(rect.top // self.chunk_size) - margin, 0)
+        last_row = min(int((rect.bottom - 1) // self.chunk_size) + margin, self.rows - 1)
+        return [(column, row) for row in range(first_row, last_row + 1)
+                for column in range(first_column, last_column + 1)]
+
+    # Call once per frame with the part of the level on screen
+    def update(self, view):
+        for key in self.keys_in(view, PREFETCH_CHUNKS):
+            if key not in self.chunks and key not in self.pending and self.executor is not None:
+                self.pending[key] = self.executor.submit(self.build_chunk, key)
+        keep = set(self.keys_in(view, KEEP_CHUNKS))
+        for key in [key for key in self.chunks if key not in keep]:
+            del self.chunks[key]
+        for key in [key for key in self.pending if key not in keep]:
+            self.pending.pop(key).cancel()
+
+    def chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            future = self.pending.pop(key, None)
+            # A chunk that is needed right now and not ready yet is built here
+            chunk = (future.result() if future is not None else self.build_chunk(key)).convert()
+            self.chunks[key] = chunk
+        return chunk
+
+    # Paint the screen rect, the level seen from offset
+    def draw(self, screen, rect, offset):
+        area = rect.move(offset)
+        screen.fill(self.background, rect)
+        for key in self.keys_in(area.inflate(2, 2)):  # Rounded chunk edges may reach one pixel further
+            chunk_rect = self.chunk_rect(key)
+            visible = area.clip(chunk_rect)
+            if not visible:
+                continue
+            screen.blit(self.chunk(key), (visible.left - offset[0], visible.top - offset[1]),
+                        visible.move(-chunk_rect.left, -chunk_rect.top))
+
+    # Tiles in rows first_row..last_row changed, their chunks are built again when next drawn
+    def invalidate_rows(self, first_row, last_row):
+        first, last = first_row // self.chunk_tiles, last_row // self.chunk_tiles
+        for key in [key for key in self.chunks if first <= key[1] <= last]:
+            del self.chunks[key]
+        for key in [key for key in self.pending if first <= key[1] <= last]:
+            self.pending.pop(key).cancel()
+
+    # Call before the grid is edited: builds not started are cancelled, running ones finish first
+    def wait_pending(self):
+        for key in [key for key, future in self.pending.items() if future.cancel()]:
+            del self.pending[key]
+        wait(list(self.pending.values()))
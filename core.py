@@ -0,0 +1,518 @@
+import hashlib
+
+import pygame
+
+import levels
+from broadphase import SpatialHash
+from level_cache import BuiltLevel
+from platforms import MovingPlatform, PlatformSystem
+from profiler import COLLISIONS, INPUT, MOVE, PLATFORMS
+from scheduler import Scheduler
+from tilemap import CUP, SOLID, SPIKE, TileMap
+
+# Game rules without a window or a sound card. main.py draws and plays sounds,
+# headless runners just call Game.step() as fast as they can.
+
+# The simulation always advances in fixed 1/60 s ticks. Speeds, gravity and counters are per tick.
+SIMULATION_RATE = 60
+FIXED_DT = 1 / SIMULATION_RATE
+
+# Sizes and speeds at the base resolution (1024 px wide, 8 px tiles), scaled with the tile size
+BASE_TILE_SIZE = 8
+SCREEN_COLUMNS = 128  # The screen is always 128 tiles wide
+PLAYER_SIZE = (14, 17)
+CURSOR_SIZE = (12, 19)
+PLAYER_SPEED = 5
+GRAVITY = 1
+JUMP_VELOCITY = -15
+CURSOR_SPEED = 2
+BROADPHASE_TILES = 8  # Spatial hash cell size in tiles
+
+DEATH_ANIMATION_TICKS = 30
+MOUSE_INACTIVITY_THRESHOLD = 3  # seconds
+CALM_CURSOR_THRESHOLD = 3.1556926 * (10**113)  # The cursor never gets angry on the title and end screens
+RESPAWN_DELAY = 2  # seconds
+LEVEL_COMPLETE_DELAY = 4
+QUIT_DELAY = 2
+
+TITLE_LEVEL = 0
+END_LEVEL = 12
+
+# Player sprite frames
+RIGHT_FRAMES = [0, 1, 2, 3]
+DEATH_FRAME = 4
+
+# Game states, everything but PLAYING waits on the scheduler
+PLAYING = "playing"
+RESPAWNING = "respawning"
+LEVEL_COMPLETE = "level_complete"
+QUITTING = "quitting"
+
+# Buttons, the frontend maps keys to them
+LEFT = "left"
+RIGHT = "right"
+JUMP = "jump"
+START = "start"  # Leaves the title screen
+PRESS = "press"
+RELEASE = "release"
+
+# Events returned by Game.step() for sounds, screens and saving progress
+RESPAWN_STARTED = "respawn_started"
+RESPAWNED = "respawned"
+LEVEL_COMPLETED = "level_completed"  # value: time taken in seconds
+LEVEL_LOADED = "level_loaded"  # value: new level index
+QUIT_STARTED = "quit_started"
+
+
+# Input for one step
+class Inputs:
+    def __init__(self, buttons=None, mouse=None, quit=False):
+        self.buttons = buttons if buttons is not None else []  # (PRESS or RELEASE, button) in arrival order
+        self.mouse = mouse  # Latest mouse position when the mouse moved
+        self.quit = quit
+
+
+# Left edge of the view: centered on the player, kept inside the level
+def camera_position(center, view, level):
+    return min(max(center - view // 2, 0), max(level - view, 0))
+
+
+def level_filename(level_index):
+    return "level" + str(level_index) + ".txt"
+
+
+# Level data the simulation needs. Compiled levels are used when they are up to date.
+def build_level(filename, tile_size, platform_image=None):
+    level = levels.load_level(filename)
+    tilemap = TileMap(level.grid, tile_size)
+    broadphase = SpatialHash(BROADPHASE_TILES * tile_size)
+    platform_system = PlatformSystem(level.platform_data, tile_size, platform_image, broadphase)
+    return BuiltLevel(level, tilemap, platform_system, broadphase, None)
+
+
+class GameObject(pygame.sprite.Sprite):
+    def __init__(self, x, y, size, tile_type=None):
+        super().__init__()
+        self.rect = pygame.Rect((0, 0), size)
+        self.rect.topleft = (x, y)
+        self.tile_type = tile_type
+        self.y_velocity = 0
+        self.is_on_ground = False
+        self.platform = None
+
+    # Solid things under the sprite: moving platforms first, then tiles from the top row down.
+    # Tiles are looked up in the grid cells the sprite covers, platforms come from the broadphase.
+    def solid_collisions(self, broadphase, tilemap):
+        collisions = [(other.rect, other) for other in broadphase.collide(self.rect) if isinstance(other, MovingPlatform)]
+        collisions += [(rect, None) for rect in tilemap.collide(self.rect, SOLID)]
+        return collisions
+
+    def move(self, dx, dy, broadphase, tilemap):
+        # X-axis movement
+        self.rect.x += dx
+        collisions = self.solid_collisions(broadphase, tilemap)
+        for other_rect, other in collisions:
+            if dx > 0:
+                self.rect.right = other_rect.left
+                dx = 0
+            elif dx < 0:
+                self.rect.left = other_rect.right
+                dx = 0
+
+        # Y-axis movement
+        self.rect.y += dy
+        collisions = self.solid_collisions(broadphase, tilemap)
+        for other_rect, other in collisions:
+            if dy > 0:
+                self.rect.bottom = other_rect.top
+                self.is_on_ground = True
+                self.y_velocity = 0
+                # Attach to platform
+                if isinstance(other, MovingPlatform):
+                    self.platform = other
+            elif dy < 0:
+                self.rect.top = other_rect.bottom
+                self.y_velocity = 0
+            dy = 0
+        return dx, dy
+
+
+# One running game: the level, the player, platforms and the angry cursor
+class Game:
+    def __init__(self, level_index, tile_size=BASE_TILE_SIZE, load_level=None, mouse=(0, 0), cursor_size=CURSOR_SIZE,
+                 spike_masks=None):
+        self.tile_size = tile_size
+        self.scale_factor = tile_size / BASE_TILE_SIZE
+        self.width = SCREEN_COLUMNS * tile_size
+        self.load_level = load_level or (lambda filename: build_level(filename, tile_size))
+        self.player_speed = PLAYER_SPEED * self.scale_factor
+        self.gravity = GRAVITY * self.scale_factor
+        self.jump_velocity = JUMP_VELOCITY * self.scale_factor
+        self.cursor_speed = CURSOR_SPEED * self.scale_factor
+
+        self.scheduler = Scheduler()
+        self.state = PLAYING
+        self.running = True
+        self.events = []
+        self.time = 0  # Simulation time in seconds
+        self.ticks = 0
+        self.phase_timer = None  # profiler.PhaseTimer to time the parts of a tick
+        # masks.CollisionMasks: a spike only kills where its pixels meet the player's, not its whole tile
+        self.spike_masks = spike_masks
+
+        # Player
+        player_size = (int(PLAYER_SIZE[0] * self.scale_factor), int(PLAYER_SIZE[1] * self.scale_factor))
+        self.player = GameObject(0, 0, player_size)
+        self.player_previous = (0, 0)  # Position before the last tick, for interpolated drawing
+        self.player_frame = 0
+        self.current_sprite_index = 0
+        self.movement_direction = None
+        self.is_jumping = True
+        self.facing_right = True
+        self.is_dead = False
+        self.death_animation_delay = 0
+
+        # Levels may be wider than the screen, the camera follows the player through them.
+        # It only scrolls sideways, rows below the screen stay hidden as they always were.
+        self.camera = (0, 0)
+        self.camera_previous = (0, 0)
+
+        # Angry cursor, it follows the mouse until the mouse rests. The mouse is in screen coordinates.
+        self.mouse_position = mouse
+        self.angry_cursor_x, self.angry_cursor_y = mouse
+        self.cursor_attached = True
+        self.mouse_inactivity_timer = 0
+        self.mouse_inactivity_threshold = MOUSE_INACTIVITY_THRESHOLD
+        self.cursor_rect = pygame.Rect((0, 0), cursor_size)
+        self.angry_cursor = pygame.sprite.Sprite()
+        self.angry_cursor.rect = self.cursor_rect
+
+        self.level_index = level_index
+        self.enter_level(self.load_level(level_filename(level_index)))
+        self.player.rect.topleft = self.spawn_position()
+        self.platform_system.update(0)
+        self.snap_interpolation()
+        self.angry_cursor_x, self.angry_cursor_y = self.mouse_in_level()
+        self.start_time = self.time
+
+    # Switch the game over to a built level
+    def enter_level(self, built):
+        self.built = built
+        self.level = built.level
+        self.tilemap = built.tilemap
+        # The player can walk anywhere in the level, and at least across the screen
+        self.level_width = max(self.width, self.tilemap.width * self.tile_size)
+        self.broadphase = built.broadphase
+        self.broadphase.insert(self.angry_cursor, self.cursor_rect)
+        # Платформы обновляются одним шагом через массивы, уровень из кэша начинается заново
+        self.platform_system = built.platform_system
+        self.platform_system.rewind()
+        self.moving_platforms = self.platform_system.platforms
+
+    # The spawn tile is found once when the level is loaded (or compiled)
+    def spawn_position(self):
+        if self.level.spawn is None:
+            print("Error: No 't' tile found in the level data.  Spawning at 0,0")
+            player_start_x, player_start_y = 0, 0
+        else:
+            player_start_x, player_start_y = self.level.spawn
+        return player_start_x * self.tile_size, player_start_y * self.tile_size - self.player.rect.height
+
+    # Forget the last move, so a teleport is not drawn as a slide across the level
+    def snap_interpolation(self):
+        self.player_previous = self.player.rect.topleft
+        self.update_camera()
+        self.camera_previous = self.camera
+        self.platform_system.snap()
+
+    def update_camera(self):
+        self.camera = (camera_position(self.player.rect.centerx, int(self.width), int(self.level_width)), 0)
+
+    def mouse_in_level(self):
+        return self.mouse_position[0] + self.camera[0], self.mouse_position[1] + self.camera[1]
+
+    # Everything the rules depend on, for comparing two runs of the same inputs
+    def snapshot(self):
+        player = self.player
+        platforms = self.platform_system
+        return {
+            "level_index": self.level_index,
+            "state": self.state,
+            "ticks": self.ticks,
+            "time": self.time,
+            "start_time": self.start_time,
+            "player": tuple(player.rect),
+            "y_velocity": player.y_velocity,
+            "is_on_ground": player.is_on_ground,
+            "platform": player.platform.index if player.platform else None,
+            "player_frame": self.player_frame,
+            "current_sprite_index": self.current_sprite_index,
+            "movement_direction": self.movement_direction,
+            "is_jumping": self.is_jumping,
+            "facing_right": self.facing_right,
+            "is_dead": self.is_dead,
+            "death_animation_delay": self.death_animation_delay,
+            "cursor": (self.angry_cursor_x, self.angry_cursor_y),
+            "cursor_attached": self.cursor_attached,
+            "mouse_inactivity_timer": self.mouse_inactivity_timer,
+            "platform_x": platforms.current_x.tolist(),
+            "platform_y": platforms.current_y.tolist(),
+            "platform_state": platforms.state.tolist(),
+            "platform_timer": platforms.timer.tolist(),
+        }
+
+    def state_digest(self):
+        return hashlib.sha1(repr(sorted(self.snapshot().items())).encode()).digest()
+
+    def emit(self, event, value=None):
+        self.events.append((event, value))
+
+    # Advance the game by one tick. Returns the events of this tick as (event, value) pairs.
+    def step(self, inputs=None, dt=FIXED_DT):
+        timer = self.phase_timer
+        if timer:
+            timer.start(INPUT)
+        self.events = []
+        if inputs is not None:
+            self.apply_inputs(inputs)
+        self.time += dt
+        self.ticks += 1
+        self.scheduler.update(dt)
+        if self.state == PLAYING:
+            self.tick(dt)
+        if timer:
+            timer.stop()
+        return self.events
+
+    def apply_inputs(self, inputs):
+        if self.state == PLAYING:
+            if inputs.mouse is not None:
+                self.mouse_inactivity_timer = 0
+                self.angry_cursor_x, self.angry_cursor_y = inputs.mouse  # Follow mouse movement
+                self.cursor_attached = True  # Re-attach when moving
+            for action, button in inputs.buttons:
+                if self.state != PLAYING or self.is_dead:
+                    break
+                self.press(button) if action == PRESS else self.release(button)
+        if inputs.mouse is not None:
+            self.mouse_position = inputs.mouse
+        if inputs.quit and self.state != QUITTING:
+            self.quit()
+
+    def press(self, button):
+        player = self.player
+        title = self.level_index == TITLE_LEVEL
+        if button == RIGHT and not title:
+            self.movement_direction = "right"
+        if button == LEFT and not title:
+            self.movement_direction = "left"
+        if button == START and player.is_on_ground and title:
+            self.next_level()
+            if not self.level.height:
+                self.quit()  # No more levels, quit the game
+        elif button == JUMP and player.is_on_ground:
+            self.is_jumping = True
+            player.y_velocity = self.jump_velocity
+            player.is_on_ground = False
+            if player.platform:  # Detach from platform on jump
+                player.platform = None
+
+    def release(self, button):
+        title = self.level_index == TITLE_LEVEL
+        if button == RIGHT and self.movement_direction == "right" and not title:
+            self.movement_direction = None
+        if button == LEFT and self.movement_direction == "left" and not title:
+            self.movement_direction = None
+
+    def tick(self, dt):
+        player = self.player
+        timer = self.phase_timer
+        self.player_previous = player.rect.topleft
+        self.camera_previous = self.camera
+        if self.level_index in (TITLE_LEVEL, END_LEVEL):
+            self.mouse_inactivity_threshold = CALM_CURSOR_THRESHOLD
+
+        # Player movement
+        dx, dy = 0, 0
+        if not self.is_dead:
+            if self.movement_direction == "right":
+                dx += self.player_speed
+                self.player_frame = (self.player_frame + 1) % (len(RIGHT_FRAMES) * 2)
+                self.current_sprite_index = RIGHT_FRAMES[self.player_frame // 2]
+                self.facing_right = True
+            elif self.movement_direction == "left":
+                dx -= self.player_speed
+                self.player_frame = (self.player_frame + 1) % (len(RIGHT_FRAMES) * 2)
+                self.current_sprite_index = RIGHT_FRAMES[self.player_frame // 2]
+                self.facing_right = False
+            else:
+                self.current_sprite_index = 0
+
+            # Jump and gravity
+            if self.is_jumping:
+                dy += player.y_velocity
+                player.y_velocity += self.gravity
+            elif not player.is_on_ground:
+                dy += self.gravity
+
+            # Move the player
+            if timer:
+                timer.start(MOVE)
+            original_dx = dx  # Store original dx
+            dx, dy = player.move(dx, dy, self.broadphase, self.tilemap)
+
+            # Check if the player is on the platform and adjust horizontal movement
+            if player.platform:
+                player.rect.x += player.platform.dx
+                player.rect.y += player.platform.dy
+                player.is_on_ground = True
+
+                # If trying to move against the platform, reset the movement
+                if (original_dx > 0 and player.platform.dx < 0) or (original_dx < 0 and player.platform.dx > 0):
+                    dx = 0  # Reset horizontal movement
+
+        # Limit player movement within level bounds
+        if player.rect.right > self.level_width:
+            player.rect.right = self.level_width
+        if player.rect.left < 0:
+            player.rect.left = 0
+        self.update_camera()
+
+        # Spike collision check
+        if timer:
+            timer.start(COLLISIONS)
+        if not self.is_dead and self.touches_spike():
+            self.die()
+
+        # Win condition (cup collision)
+        if not self.is_dead and self.tilemap.collides(player.rect, CUP):
+            self.complete_level()
+
+        # Death animation
+        if self.is_dead:
+            self.death_animation_delay += 1
+            if self.death_animation_delay > DEATH_ANIMATION_TICKS:
+                self.respawn()
+
+        # The game freezes while a timed screen runs
+        if self.state != PLAYING:
+            return
+
+        # Angry Cursor Logic
+        self.mouse_inactivity_timer += dt  # Accumulate seconds
+
+        if self.mouse_inactivity_timer >= self.mouse_inactivity_threshold:
+            self.cursor_attached = False  # Detach after inactivity
+
+            # Calculate direction towards the player
+            dir_x = player.rect.centerx - self.angry_cursor_x
+            dir_y = player.rect.centery - self.angry_cursor_y
+            distance = (dir_x**2 + dir_y**2) ** 0.5
+
+            # Normalize direction
+            if distance > 0:
+                dir_x /= distance
+                dir_y /= distance
+
+                # Move the cursor towards the player
+                self.angry_cursor_x += dir_x * self.cursor_speed
+                self.angry_cursor_y += dir_y * self.cursor_speed
+
+            # Check for cursor-player collision using rectangles
+            self.cursor_rect.center = (int(self.angry_cursor_x), int(self.angry_cursor_y))
+            self.broadphase.update(self.angry_cursor, self.cursor_rect)
+            if self.angry_cursor in self.broadphase.collide(player.rect):
+                self.die()
+        elif self.cursor_attached:
+            self.angry_cursor_x, self.angry_cursor_y = self.mouse_in_level()  # Update cursor position
+
+        # Update moving platforms
+        if timer:
+            timer.start(PLATFORMS)
+        self.platform_system.update(dt)
+
+    # The cheap grid test first, the pixel test only for spike tiles the rect touches
+    def touches_spike(self):
+        hits = self.tilemap.tile_hits(self.player.rect, SPIKE)
+        if not hits or self.spike_masks is None:
+            return bool(hits)
+        player_mask = self.spike_masks.player_mask(self.current_sprite_index, self.facing_right)
+        return self.spike_masks.touches(player_mask, self.player.rect, hits)
+
+    def die(self):
+        self.is_dead = True
+        self.current_sprite_index = DEATH_FRAME
+        self.movement_direction = None
+        self.player.y_velocity = 0
+        self.is_jumping = False
+
+    # The death frame stays up for a while, then the level starts over
+    def respawn(self):
+        self.state = RESPAWNING
+        self.emit(RESPAWN_STARTED)
+        self.scheduler.after(RESPAWN_DELAY, self.finish_respawn)
+
+    def finish_respawn(self):
+        player = self.player
+
+        # Сбрасываем позицию игрока
+        player.rect.topleft = self.spawn_position()
+
+        # Сбрасываем физику и состояние игрока
+        player.y_velocity = 0
+        self.is_jumping = False
+        player.is_on_ground = False
+        self.player_frame = 0
+        self.movement_direction = None
+        self.death_animation_delay = 0
+        self.cursor_attached = True
+        player.platform = None
+
+        # Убеждаемся, что игрок приземлился на землю после возрождения
+        player.move(0, 1, self.broadphase, self.tilemap)
+        self.snap_interpolation()
+        self.is_dead = False
+
+        # Сбрасываем позицию курсора
+        self.angry_cursor_x, self.angry_cursor_y = self.mouse_in_level()
+
+        # Сбрасываем позиции платформ
+        self.platform_system.reset()
+
+        # New attempt, the player falls onto the spawn tile
+        self.start_time = self.time
+        self.is_jumping = True
+        player.is_on_ground = False
+        self.state = PLAYING
+        self.emit(RESPAWNED)
+
+    # The time stays on screen for a while, then the next level is loaded and the game "crashes"
+    def complete_level(self):
+        self.state = LEVEL_COMPLETE
+        self.emit(LEVEL_COMPLETED, self.time - self.start_time)
+        self.scheduler.after(LEVEL_COMPLETE_DELAY, self.finish_level)
+
+    def finish_level(self):
+        self.next_level()
+        self.start_time = self.time
+        self.quit()
+
+    def next_level(self):
+        self.level_index += 1
+        self.enter_level(self.load_level(level_filename(self.level_index)))
+
+        # Reset player
+        self.player.rect.topleft = self.spawn_position()
+        self.player.platform = None
+        self.snap_interpolation()
+        self.emit(LEVEL_LOADED, self.level_index)
+
+    # The frontend plays the fake error sound, the game stops once it had time to play
+    def quit(self):
+        self.state = QUITTING
+        self.emit(QUIT_STARTED)
+        self.scheduler.clear()
+        self.scheduler.after(QUIT_DELAY, self.stop)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,61 @@
+import os
+
+# No window and no sound card, the SDL dummy drivers stand in for both
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import random
+import time
+
+import core
+
+# Chance per tick that the random player presses or releases something
+INPUT_RATE = 0.08
+BUTTONS = [core.LEFT, core.RIGHT, core.JUMP, core.START]
+
+
+# Button mashing that is the same for the same seed
+def random_inputs(rng):
+    if rng.random() >= INPUT_RATE:
+        return core.Inputs()
+    return core.Inputs([(rng.choice([core.PRESS, core.RELEASE]), rng.choice(BUTTONS))])
+
+
+# Run the game for a number of ticks without drawing anything. A game that quits is started over.
+def run(level_index, ticks, seed=0, tile_size=core.BASE_TILE_SIZE, folder="."):
+    def load_level(filename):
+        return core.build_level(os.path.join(folder, filename), tile_size)
+
+    rng = random.Random(seed)
+    game = core.Game(level_index, tile_size, load_level)
+    stats = {"ticks": ticks, "games": 1, "deaths": 0, "completed": 0}
+    start = time.perf_counter()
+    for _ in range(ticks):
+        if not game.running:
+            game = core.Game(level_index, tile_size, load_level)
+            stats["games"] += 1
+        for event, value in game.step(random_inputs(rng)):
+            if event == core.RESPAWN_STARTED:
+                stats["deaths"] += 1
+            elif event == core.LEVEL_COMPLETED:
+                stats["completed"] += 1
+    stats["seconds"] = time.perf_counter() - start
+    stats["ticks_per_second"] = ticks / stats["seconds"] if stats["seconds"] else 0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game simulation without a window.")
+    parser.add_argument("levels", nargs="*", type=int, default=[1], help="level numbers to run")
+    parser.add_argument("--ticks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tile-size", type=float, default=core.BASE_TILE_SIZE)
+    parser.add_argument("--folder", default=".", help="folder with the levelN.txt files")
+    args = parser.parse_args()
+    for level_index in args.levels:
+        stats = run(level_index, args.ticks, args.seed, args.tile_size, args.folder)
+        print(f"level{level_index}: {stats['ticks']} ticks in {stats['seconds']:.2f} s "
+              f"({stats['ticks_per_second']:.0f} ticks/s), {stats['games']} games, "
+              f"{stats['deaths']} deaths, {stats['completed']} completed")
@@ -0,0 +1,156 @@
+import os
+import time
+
+import levels
+from chunks import ChunkedLayer
+from platforms import STATE_ARRAYS, PlatformSystem
+from renderer import build_level_layer, redraw_rows
+from tilemap import grid_from_rows
+
+# Dev mode: the level file being played is watched, and a saved edit is patched into the running
+# game. Only the tile rows that differ are written into the grid and drawn again, platforms whose
+# "//" line is unchanged keep moving where they are, and the player stays where they stand.
+
+POLL_INTERVAL = 0.25  # Seconds between looks at the file
+
+
+def read_rows(filename):
+    with open(filename, "r") as file:
+        return [row.strip() for row in file]
+
+
+def platform_lines(rows):
+    return [row[2:] for row in rows if row.startswith("//")]
+
+
+class LevelWatcher:
+    def __init__(self, filename=None, clock=time.perf_counter):
+        self.clock = clock
+        self.filename = None
+        self.signature = None
+        self.rows = []
+        self.checked = 0.0
+        if filename is not None:
+            self.watch(filename)
+
+    # Start watching another level file, its current text is what edits are compared against
+    def watch(self, filename):
+        self.filename = filename
+        self.signature = self.file_signature()
+        self.rows = read_rows(filename) if self.signature else []
+        self.checked = self.clock()
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None  # Shipped as a compiled level only, or deleted for a moment while saving
+        return stat.st_mtime_ns, stat.st_size
+
+    # The old and the new rows once the file was saved, None while it is unchanged
+    def poll(self):
+        now = self.clock()
+        if self.filename is None or now - self.checked < POLL_INTERVAL:
+            return None
+        self.checked = now
+        signature = self.file_signature()
+        if signature is None or signature == self.signature:
+            return None
+        self.signature = signature
+        old_rows, self.rows = self.rows, read_rows(self.filename)
+        return old_rows, self.rows
+
+
+# Indices of the text rows that differ, rows missing on one side count as changed
+def changed_rows(old_rows, new_rows):
+    return [index for index in range(max(len(old_rows), len(new_rows)))
+            if index >= len(old_rows) or index >= len(new_rows) or old_rows[index] != new_rows[index]]
+
+
+# Patch the edit into the running game and its level layer. Without tile_images only the simulation
+# is patched. Returns the new layer when the old one had to be replaced (the level changed size)
+# or None, and what was rebuilt.
+def apply_edit(game, old_rows, new_rows, tile_images=None, platform_image=None, screen_size=None, executor=None):
+    start = time.perf_counter()
+    built = game.built
+    tilemap = game.tilemap
+    level = game.level
+    new_layer = None
+    if isinstance(built.layer, ChunkedLayer):
+        built.layer.wait_pending()  # Chunk builds read the grid on a worker thread
+
+    grid = grid_from_rows(new_rows)
+    rows = changed_rows(old_rows, new_rows)
+    if grid.shape != tilemap.grid.shape:
+        # Rows got longer or were added: a new grid, drawn from scratch
+        tilemap.grid = level.grid = grid
+        tilemap.height, tilemap.width = grid.shape
+        level.height, level.width = grid.shape
+        game.level_width = max(game.width, tilemap.width * game.tile_size)
+        if tile_images is not None and built.layer is not None:
+            built.layer = new_layer = build_level_layer(tilemap, tile_images, *screen_size, executor)
+    else:
+        # Platform lines are empty grid rows, only rows with other tiles are written and drawn
+        rows = [row for row in rows if (grid[row] != tilemap.grid[row]).any()]
+        if rows and not tilemap.grid.flags.writeable:
+            tilemap.grid = level.grid = tilemap.grid.copy()  # Compiled levels are read-only mappings
+        for row in rows:
+            tilemap.grid[row] = grid[row]
+            if tile_images is None or built.layer is None:
+                continue
+            if isinstance(built.layer, ChunkedLayer):
+                built.layer.invalidate_rows(row, row)
+            else:
+                redraw_rows(built.layer, tilemap, tile_images, row, row)
+    level.spawn = levels.find_spawn(tilemap.grid)
+
+    # Platforms: lines that stayed keep their platform's state, new or edited lines start fresh
+    old_lines, new_lines = platform_lines(old_rows), platform_lines(new_rows)
+    rebuilt = 0
+    if old_lines != new_lines:
+        rebuilt = replace_platforms(game, old_lines, new_lines, platform_image)
+
+    return new_layer, {
+        "rows": len(rows),
+        "platforms": rebuilt,  # Platforms added, edited or removed
+        "milliseconds": (time.perf_counter() - start) * 1000,
+    }
+
+
+def replace_platforms(game, old_lines, new_lines, platform_image):
+    old_system = game.platform_system
+    old_state = old_system.save_state()
+    platform_data = []
+    lines = []
+    for line in new_lines:
+        data = levels.parse_platform_data(line)
+        if data:
+            platform_data.append(data)
+            lines.append(line)
+    available = {}  # Line -> indices of the old platforms with that line
+    for index, line in enumerate(line for line in old_lines if levels.parse_platform_data(line)):
+        available.setdefault(line, []).append(index)
+    kept = {}  # Old platform index -> new one
+
+    for platform in old_system.platforms:
+        game.broadphase.remove(platform)
+    system = PlatformSystem(platform_data, game.tile_size, platform_image, game.broadphase)
+    system.update(0)
+    state = system.save_state()
+    rebuilt = 0
+    for index, line in enumerate(lines):
+        if available.get(line):
+            old_index = available[line].pop(0)
+            kept[old_index] = index
+            for name in STATE_ARRAYS:
+                state[name][index] = old_state[name][old_index]
+        else:
+            rebuilt += 1
+    system.load_state(state)
+
+    # A player riding an edited platform falls onto whatever is below now
+    rider = game.player.platform
+    game.player.platform = system.platforms[kept[rider.index]] if rider is not None and rider.index in kept else None
+    game.built.platform_system = game.platform_system = system
+    game.moving_platforms = system.platforms
+    return rebuilt + old_system.count - len(kept)  # New or edited ones and removed ones
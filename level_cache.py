@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# A level ready to play: data, tile grid, platforms, their broadphase and the baked layer
+class BuiltLevel:
+    def __init__(self, level, tilemap, platform_system, broadphase, layer):
+        self.level = level
+        self.tilemap = tilemap
+        self.platform_system = platform_system
+        self.broadphase = broadphase
+        self.layer = layer
+
+
+# LRU cache of built levels. The next level can be built on a worker thread
+# while the current one is played, so a level change is only a lookup.
+class LevelCache:
+    def __init__(self, build, capacity=4):
+        self.build = build
+        self.capacity = capacity
+        self.levels = OrderedDict()
+        self.pending = OrderedDict()  # Prefetches not asked for yet, oldest first
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+
+    def prefetch(self, name):
+        if name not in self.levels and name not in self.pending:
+            self.pending[name] = self.executor.submit(self.build, name)
+            # Levels prefetched and never played (the player quit to the title) are dropped like the LRU drops
+            while len(self.pending) > self.capacity:
+                self.pending.popitem(last=False)[1].cancel()
+
+    def get(self, name):
+        if name in self.levels:
+            self.hits += 1
+            self.levels.move_to_end(name)
+            return self.levels[name]
+        future = self.pending.pop(name, None)
+        built = None
+        if future is not None:
+            try:
+                built = future.result()  # Usually finished long ago
+                self.prefetch_hits += 1
+            except Exception:
+                built = None  # Build again here so the error shows up on the main thread
+        if built is None:
+            self.misses += 1
+            built = self.build(name)
+        self.put(name, built)
+        return built
+
+    def put(self, name, built):
+        self.levels[name] = built
+        self.levels.move_to_end(name)
+        while len(self.levels) > self.capacity:
+            self.levels.popitem(last=False)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "cached": len(self.levels),
+            "hits": self.hits,
+            "prefetch_hits": self.prefetch_hits,
+            "misses": self.misses,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,156 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import core
+import headless
+import levels
+
+# Random levels in the levelN.txt format for stress tests, the same seed gives the same file.
+# The layout follows the shipped levels: a floor of "t" over a row of spikes, the spawn on
+# the floor in the first column, ledges and spike strips above and "//" platform lines at the end.
+
+WIDTH = core.SCREEN_COLUMNS
+HEIGHT = 64
+DENSITY = 0.1  # Share of the cells above the floor that get a tile
+SPIKE_RATIO = 0.2  # Share of those tiles that are spikes
+PLATFORMS = 4
+PLATFORM_SPEED = 8.0  # Tiles per second
+MAX_PLATFORM_TRIP = 20  # Tiles
+SPAWN_CLEARANCE = 4  # Free columns and rows around the spawn
+
+# Segment lengths of ledges and spike strips
+MIN_SEGMENT = 3
+MAX_SEGMENT = 12
+
+
+# Rows of a level file: the tile rows, an empty line, then one "//" line per platform
+def generate(width=WIDTH, height=HEIGHT, density=DENSITY, spike_ratio=SPIKE_RATIO, platforms=PLATFORMS,
+             platform_speed=PLATFORM_SPEED, seed=0):
+    if width < SPAWN_CLEARANCE + 2 or height < SPAWN_CLEARANCE + 3:
+        raise ValueError(f"a level needs at least {SPAWN_CLEARANCE + 2}x{SPAWN_CLEARANCE + 3} tiles")
+    rng = random.Random(seed)
+    grid = [["."] * width for _ in range(height)]
+    floor = height - 2
+    grid[floor] = ["t"] * width
+    grid[height - 1] = ["s"] * width
+
+    # Ledges and spike strips, none of them near the spawn
+    free = floor * width
+    wanted = int(free * density)
+    placed = 0
+    for _ in range(wanted * 4):  # A nearly full grid takes many tries, stop at some point
+        if placed >= wanted:
+            break
+        length = rng.randint(MIN_SEGMENT, MAX_SEGMENT)
+        row = rng.randrange(0, floor)
+        column = rng.randrange(0, width)
+        if column < SPAWN_CLEARANCE and row >= floor - SPAWN_CLEARANCE:
+            continue
+        tile = "s" if rng.random() < spike_ratio else "t"
+        for cell in range(column, min(column + length, width)):
+            if grid[row][cell] == ".":
+                grid[row][cell] = tile
+                placed += 1
+                if tile == "t" and row + 1 < floor and grid[row + 1][cell] == "." and rng.random() < 0.5:
+                    grid[row + 1][cell] = "g"  # Some ledges are two tiles thick
+                    placed += 1
+
+    # The cup stands on the floor or on a ledge in the right quarter
+    ledges = [(row, column) for row in range(1, floor + 1) for column in range(width * 3 // 4, width)
+              if grid[row][column] == "t" and grid[row - 1][column] == "."]
+    row, column = rng.choice(ledges) if ledges else (floor, width - 1)
+    grid[row - 1][column] = "w"
+
+    rows = ["".join(row) for row in grid]
+    rows.append("")
+    for _ in range(platforms):
+        platform_width = rng.randint(2, 6)
+        x_start = rng.randrange(0, width - platform_width + 1)  # The whole platform inside the level
+        y_start = rng.randrange(1, floor)
+        if rng.random() < 0.5:
+            x_end = min(max(x_start + rng.randint(-MAX_PLATFORM_TRIP, MAX_PLATFORM_TRIP), 0), width - platform_width)
+            y_end = y_start
+        else:
+            x_end = x_start
+            y_end = min(max(y_start + rng.randint(-MAX_PLATFORM_TRIP, MAX_PLATFORM_TRIP), 1), floor - 1)
+        trip = max(abs(x_end - x_start), abs(y_end - y_start)) / platform_speed
+        wait = round(rng.uniform(0, 2), 2)
+        trip = round(max(trip, 0.05), 2)
+        rows.append(f"//{x_start}:{y_start}:{platform_width}:{x_end}:{y_end}:{trip:g}:{wait:g}:{trip:g}")
+    return rows
+
+
+def write_level(filename, rows):
+    temp_path = filename + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write("\n".join(rows) + "\n")
+    os.replace(temp_path, filename)
+
+
+# Load time, memory of the built level and simulation speed of one level file
+def measure(filename, ticks=1000, seed=0):
+    start = time.perf_counter()
+    level = levels.read_text_level(filename)
+    parse_seconds = time.perf_counter() - start
+    tracemalloc.start()
+    start = time.perf_counter()
+    core.build_level(filename, core.BASE_TILE_SIZE)
+    build_seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    folder, name = os.path.split(filename)
+    level_index = int(name[len("level"):-len(".txt")])
+    stats = headless.run(level_index, ticks, seed, folder=folder or ".")
+    return {
+        "tiles": level.width * level.height,
+        "platforms": len(level.platform_data),
+        "parse_seconds": parse_seconds,
+        "build_seconds": build_seconds,
+        "build_bytes": peak,
+        "ticks_per_second": stats["ticks_per_second"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write random levels for stress tests.")
+    parser.add_argument("folder", help="folder to write levelN.txt files to")
+    parser.add_argument("--first", type=int, default=1, help="number of the first level file")
+    parser.add_argument("--count", type=int, default=1, help="levels to write, each with the next seed")
+    parser.add_argument("--width", type=int, default=WIDTH)
+    parser.add_argument("--height", type=int, default=HEIGHT)
+    parser.add_argument("--density", type=float, default=DENSITY)
+    parser.add_argument("--spike-ratio", type=float, default=SPIKE_RATIO)
+    parser.add_argument("--platforms", type=int, default=PLATFORMS)
+    parser.add_argument("--platform-speed", type=float, default=PLATFORM_SPEED, help="tiles per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, nargs="*", default=None,
+                        help="instead write one level per factor, with width, height and platforms "
+                             "multiplied by it, and report how loading and ticks scale")
+    parser.add_argument("--ticks", type=int, default=1000, help="ticks to simulate per level with --scale")
+    args = parser.parse_args()
+
+    os.makedirs(args.folder, exist_ok=True)
+    if args.scale:
+        print(f"{'factor':>6} {'tiles':>9} {'platforms':>9} {'parse':>9} {'build':>9} {'memory':>10} {'ticks/s':>9}")
+        for number, factor in enumerate(args.scale, args.first):
+            filename = os.path.join(args.folder, core.level_filename(number))
+            write_level(filename, generate(args.width * factor, args.height * factor, args.density, args.spike_ratio,
+                                           args.platforms * factor, args.platform_speed, args.seed))
+            stats = measure(filename, args.ticks, args.seed)
+            print(f"{factor:>6} {stats['tiles']:>9} {stats['platforms']:>9} {stats['parse_seconds'] * 1000:>7.1f}ms "
+                  f"{stats['build_seconds'] * 1000:>7.1f}ms {stats['build_bytes'] / 1024:>8.0f}kB "
+                  f"{stats['ticks_per_second']:>9.0f}")
+    else:
+        for number in range(args.first, args.first + args.count):
+            filename = os.path.join(args.folder, core.level_filename(number))
+            write_level(filename, generate(args.width, args.height, args.density, args.spike_ratio, args.platforms,
+                                           args.platform_speed, args.seed + number - args.first))
+            print(filename)
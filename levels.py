@@ -0,0 +1,164 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+from tilemap import TILE_CODES, grid_from_rows
+
+# Compiled level file: header, tile grid, platform table
+COMPILED_EXTENSION = ".lvl"
+LEVEL_MAGIC = b"IWLV"
+LEVEL_VERSION = 1
+# magic, version, width, height, platform count, spawn column, spawn row, source size, source mtime, payload crc32
+LEVEL_HEADER = struct.Struct("<4sHxxIIIiiQqI4x")
+PLATFORM_DTYPE = np.dtype([
+    ("x_start", "<i4"),
+    ("y_start", "<i4"),
+    ("width", "<i4"),
+    ("x_end", "<i4"),
+    ("y_end", "<i4"),
+    ("pad", "<i4"),
+    ("time_to_target", "<f8"),
+    ("wait_time", "<f8"),
+    ("time_to_start", "<f8"),
+])
+PLATFORM_FIELDS = ["x_start", "y_start", "width", "x_end", "y_end", "time_to_target", "wait_time", "time_to_start"]
+
+
+class Level:
+    def __init__(self, name, grid, platform_data, spawn, compiled=False):
+        self.name = name
+        self.grid = grid  # Tile codes, rows x columns
+        self.platform_data = platform_data  # One dict per "//" line
+        self.spawn = spawn  # (column, row) of the spawn tile
+        self.compiled = compiled
+        self.height, self.width = grid.shape
+
+
+def parse_platform_data(line):
+    parts = line.split(":")
+    if len(parts) != 8:
+        print("Invalid platform data format.")
+        return None
+    try:
+        x_start, y_start = int(parts[0]), int(parts[1])
+        width = int(parts[2])
+        x_end, y_end = int(parts[3]), int(parts[4])
+        time_to_target, wait_time, time_to_start = float(parts[5]), float(parts[6]), float(parts[7])
+        return {
+            "x_start": x_start,
+            "y_start": y_start,
+            "width": width,
+            "x_end": x_end,
+            "y_end": y_end,
+            "time_to_target": time_to_target,
+            "wait_time": wait_time,
+            "time_to_start": time_to_start,
+        }
+    except ValueError:
+        print("Error converting platform data to numbers.")
+        return None
+
+
+# The player spawns on the lowest "t" tile in the first column
+def find_spawn(grid):
+    rows = np.nonzero(grid[:, 0] == TILE_CODES["t"])[0] if grid.size else []
+    if len(rows) == 0:
+        return None
+    return 0, int(rows[-1])
+
+
+def parse_level(filename, rows):
+    platform_data = []
+    for row in rows:
+        if row.startswith("//"):
+            data = parse_platform_data(row[2:])
+            if data:
+                platform_data.append(data)
+    grid = grid_from_rows(rows)
+    return Level(filename, grid, platform_data, find_spawn(grid))
+
+
+def read_text_level(filename):
+    with open(filename, "r") as file:
+        return parse_level(filename, [row.strip() for row in file])
+
+
+def compiled_path(filename):
+    return os.path.splitext(filename)[0] + COMPILED_EXTENSION
+
+
+# Turn levelN.txt into levelN.lvl next to it
+def compile_level(filename):
+    level = read_text_level(filename)
+    platforms = np.zeros(len(level.platform_data), dtype=PLATFORM_DTYPE)
+    for index, data in enumerate(level.platform_data):
+        for field in PLATFORM_FIELDS:
+            platforms[index][field] = data[field]
+    payload = np.ascontiguousarray(level.grid, dtype=np.uint8).tobytes()
+    payload += b"\0" * (-len(payload) % 8)  # Keep the platform table aligned
+    payload += platforms.tobytes()
+    spawn_column, spawn_row = level.spawn if level.spawn else (-1, -1)
+    source = os.stat(filename)
+    header = LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, level.width, level.height, len(platforms),
+                               spawn_column, spawn_row, source.st_size, source.st_mtime_ns, zlib.crc32(payload))
+    path = compiled_path(filename)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(header)
+        file.write(payload)
+    os.replace(temp_path, path)
+    return path
+
+
+# Memory-map a compiled level. Returns None if it is missing, stale or damaged.
+def read_compiled_level(filename, verify=True):
+    path = compiled_path(filename)
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < LEVEL_HEADER.size:
+        return None
+    (magic, version, width, height, platform_count, spawn_column, spawn_row,
+     source_size, source_mtime, checksum) = LEVEL_HEADER.unpack_from(data)
+    if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+        return None
+    try:
+        source = os.stat(filename)
+        if source.st_size != source_size or source.st_mtime_ns != source_mtime:
+            return None  # The text file was edited after compiling
+    except OSError:
+        pass  # Shipping only the compiled file is fine
+    grid_size = width * height
+    table_offset = LEVEL_HEADER.size + grid_size + (-grid_size % 8)
+    if len(data) != table_offset + platform_count * PLATFORM_DTYPE.itemsize:
+        return None
+    if verify and zlib.crc32(memoryview(data)[LEVEL_HEADER.size:]) != checksum:
+        return None
+    # Both arrays are views into the mapping, nothing is copied
+    grid = np.frombuffer(data, dtype=np.uint8, count=grid_size, offset=LEVEL_HEADER.size).reshape(height, width)
+    platforms = np.frombuffer(data, dtype=PLATFORM_DTYPE, count=platform_count, offset=table_offset)
+    platform_data = [{field: platform[field].item() for field in PLATFORM_FIELDS} for platform in platforms]
+    spawn = (spawn_column, spawn_row) if spawn_row >= 0 else None
+    return Level(filename, grid, platform_data, spawn, compiled=True)
+
+
+# Compiled file when it is up to date, the text file otherwise
+def load_level(filename):
+    level = read_compiled_level(filename)
+    if level is None:
+        level = read_text_level(filename)
+    return level
+
+
+# Compile the given level files, or every levelN.txt in the current folder
+if __name__ == "__main__":
+    filenames = sys.argv[1:] or sorted(name for name in os.listdir(".")
+                                       if name.startswith("level") and name.endswith(".txt"))
+    for filename in filenames:
+        print(f"{filename} -> {compile_level(filename)}")
@@ -0,0 +1,56 @@
+import os
+
+import pygame
+
+from assets import SPRITE_COLORKEY, SPRITE_RECTS, TILE_FILES, bake_colorkey
+from core import BASE_TILE_SIZE, PLAYER_SIZE
+from tilemap import SPIKE, TILE_CODES
+
+# Pixel masks of the spike tiles and of every player frame, mirrored ones included, so a death
+# needs a spike pixel under a player pixel. Built from the image files the way assets.py scales
+# them, without a display, once per tile size.
+
+PLAYER_SHEET = "qubic.png"
+
+_cache = {}  # (tile size, folder) -> CollisionMasks
+
+
+class CollisionMasks:
+    def __init__(self, tile_size, folder="."):
+        scale_factor = tile_size / BASE_TILE_SIZE
+        self.tiles = {}  # Tile code -> Mask
+        for char, code in TILE_CODES.items():
+            if SPIKE[code]:
+                image = pygame.image.load(os.path.join(folder, TILE_FILES[char]))
+                self.tiles[code] = pygame.mask.from_surface(pygame.transform.scale(image, (tile_size, tile_size)))
+
+        sheet = pygame.image.load(os.path.join(folder, PLAYER_SHEET))
+        size = (int(PLAYER_SIZE[0] * scale_factor), int(PLAYER_SIZE[1] * scale_factor))  # Every frame is scaled to it
+        self.player = []  # Sprite index -> Mask, facing right
+        self.player_flipped = []  # Facing left
+        for rect in SPRITE_RECTS:
+            frame = pygame.Surface(pygame.Rect(rect).size, pygame.SRCALPHA)
+            frame.blit(sheet, (0, 0), rect)
+            frame.set_colorkey(SPRITE_COLORKEY)
+            frame = pygame.transform.scale(bake_colorkey(frame), size)
+            self.player.append(pygame.mask.from_surface(frame))
+            self.player_flipped.append(pygame.mask.from_surface(pygame.transform.flip(frame, True, False)))
+
+    def player_mask(self, sprite_index, facing_right):
+        return self.player[sprite_index] if facing_right else self.player_flipped[sprite_index]
+
+    # Whether the player mask at player_rect overlaps any of the tiles, given as (rect, code) pairs
+    def touches(self, player_mask, player_rect, tiles):
+        for rect, code in tiles:
+            mask = self.tiles.get(code)
+            if mask is None or mask.overlap(player_mask, (player_rect.x - rect.x, player_rect.y - rect.y)):
+                return True
+        return False
+
+
+def collision_masks(tile_size, folder="."):
+    key = (tile_size, os.path.abspath(folder))
+    masks = _cache.get(key)
+    if masks is None:
+        masks = _cache[key] = CollisionMasks(tile_size, folder)
+    return masks
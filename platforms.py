@@ -0,0 +1,238 @@
+import numpy as np
+import pygame
+
+# Platform states
+WAITING_AT_START = 0
+MOVING_TO_TARGET = 1
+WAITING_AT_TARGET = 2
+MOVING_TO_START = 3
+
+RESET_LIFT = 10  # A reset platform starts this many pixels above its start point
+
+# Arrays that change while the platforms run, see save_state()
+STATE_ARRAYS = ["current_x", "current_y", "rect_x", "rect_y", "previous_x", "previous_y",
+                "speed_x", "speed_y", "state", "timer", "is_reset", "dx", "dy"]
+
+
+# Round to whole pixels the way pygame.Rect does (halves away from zero)
+def round_pixels(values):
+    whole = np.trunc(values)
+    return (whole + np.sign(values) * (np.abs(values - whole) >= 0.5)).astype(np.int64)
+
+
+# Speed for one leg of the trip, 0 where the leg has no duration
+def leg_speed(distance, duration, enabled):
+    speed = np.zeros_like(distance)
+    np.divide(distance, duration, out=speed, where=enabled & (duration != 0))
+    return speed
+
+
+# Moving Platform, a view of one row of the PlatformSystem arrays
+class MovingPlatform(pygame.sprite.Sprite):
+    def __init__(self, system, index, image):
+        super().__init__()
+        self.system = system
+        self.index = index
+        self.image = image
+        self.tile_type = "p"
+
+    @property
+    def rect(self):
+        return self.system.rect(self.index)
+
+    @property
+    def dx(self):
+        return float(self.system.dx[self.index])
+
+    @property
+    def dy(self):
+        return float(self.system.dy[self.index])
+
+    @property
+    def is_reset(self):
+        return bool(self.system.is_reset[self.index])
+
+    @is_reset.setter
+    def is_reset(self, value):
+        self.system.is_reset[self.index] = value
+
+
+# All moving platforms of a level as arrays, advanced together in one vectorized step
+class PlatformSystem:
+    def __init__(self, platform_data, tile_size, image=None, broadphase=None):
+        def column(key, scale=1):
+            return np.array([data[key] * scale for data in platform_data], dtype=np.float64)
+
+        # Tile coordinates converted to pixels
+        self.x_start = column("x_start", tile_size)
+        self.y_start = column("y_start", tile_size)
+        self.x_end = column("x_end", tile_size)
+        self.y_end = column("y_end", tile_size)
+        self.time_to_target = column("time_to_target")
+        self.wait_time = column("wait_time")
+        self.time_to_start = column("time_to_start")
+        self.count = len(platform_data)
+        self.tile_size = tile_size
+
+        # Platforms use the grass top image stretched to their width, the simulation alone needs no image
+        self.widths = np.array([int(data["width"] * tile_size) for data in platform_data], dtype=np.int64)
+        self.height = int(tile_size)
+        images = dict.fromkeys(self.widths.tolist())
+        if image is not None:
+            for width in images:
+                images[width] = pygame.transform.scale(image, (width, self.height))
+
+        self.platforms = [MovingPlatform(self, index, images[width]) for index, width in enumerate(self.widths.tolist())]
+        self.broadphase = None
+        self.rewind()
+
+        # Keep a broadphase in sync, re-inserting only platforms that changed cells
+        self.broadphase = broadphase
+        self.spans = None
+        if broadphase is not None:
+            self.spans = self.cell_spans()
+            for platform in self.platforms:
+                broadphase.insert(platform, platform.rect)
+
+    # Put every platform back the way a freshly built level has it, so a cached level plays the same
+    def rewind(self):
+        self.current_x = self.x_start.copy()
+        self.current_y = self.y_start - self.tile_size
+        self.rect_x = round_pixels(self.x_start)
+        self.rect_y = round_pixels(self.y_start)
+        self.previous_x = self.rect_x.copy()  # Positions before the last update, for interpolated drawing
+        self.previous_y = self.rect_y.copy()
+        self.speed_x = leg_speed(self.x_end - self.x_start, self.time_to_target, True)
+        self.speed_y = leg_speed(self.y_end - self.y_start, self.time_to_target, self.time_to_start != 0)
+        self.state = np.full(self.count, WAITING_AT_START, dtype=np.int8)
+        self.timer = np.zeros(self.count)
+        self.is_reset = np.ones(self.count, dtype=bool)
+        self.dx = np.zeros(self.count)
+        self.dy = np.zeros(self.count)
+        if self.broadphase is not None:
+            self.spans = self.cell_spans()
+            for platform in self.platforms:
+                self.broadphase.update(platform, platform.rect)
+
+    # Copies of everything update() changes, to run the same stretch of time again from here
+    def save_state(self):
+        return {name: getattr(self, name).copy() for name in STATE_ARRAYS}
+
+    def load_state(self, state):
+        for name in STATE_ARRAYS:
+            setattr(self, name, state[name].copy())
+        if self.broadphase is not None:
+            self.spans = self.cell_spans()
+            for platform in self.platforms:
+                self.broadphase.update(platform, platform.rect)
+
+    def rect(self, index):
+        return pygame.Rect(int(self.rect_x[index]), int(self.rect_y[index]), int(self.widths[index]), self.height)
+
+    # Send platforms back to their start point on the next update (player respawn).
+    # rows is a boolean mask, all platforms by default.
+    def reset(self, rows=None):
+        if rows is None:
+            self.is_reset[:] = True
+        else:
+            self.is_reset[rows] = True
+
+    # Forget the last move, so a teleported platform is not drawn sliding across the level
+    def snap(self):
+        self.previous_x = self.rect_x.copy()
+        self.previous_y = self.rect_y.copy()
+
+    # Drawing positions between the previous and the current update, alpha in [0, 1]
+    def interpolated_positions(self, alpha):
+        x = round_pixels(self.previous_x + (self.rect_x - self.previous_x) * alpha)
+        y = round_pixels(self.previous_y + (self.rect_y - self.previous_y) * alpha)
+        return x, y
+
+    def cell_spans(self):
+        cell_size = self.broadphase.cell_size
+        return np.stack([self.rect_x // cell_size, self.rect_y // cell_size,
+                         (self.rect_x + self.widths - 1) // cell_size,
+                         (self.rect_y + self.height - 1) // cell_size], axis=1).astype(np.int64)
+
+    # Advance all platforms, or only the rows set in the boolean mask rows
+    def update(self, dt, rows=None):
+        if not self.count:
+            return
+        active = np.ones(self.count, dtype=bool) if rows is None else rows
+        self.dx[active] = 0
+        self.dy[active] = 0
+        self.previous_x[active] = self.rect_x[active]
+        self.previous_y[active] = self.rect_y[active]
+
+        reset = self.is_reset & active
+        self.current_x[reset] = self.x_start[reset]
+        self.current_y[reset] = self.y_start[reset] - RESET_LIFT
+        self.previous_x[reset] = round_pixels(self.current_x[reset])
+        self.previous_y[reset] = round_pixels(self.current_y[reset])
+        self.timer[reset] = 0
+        self.state[reset] = WAITING_AT_START
+        self.is_reset[active] = False
+
+        state = self.state.copy()  # Each platform runs exactly one state per update
+
+        # Moving towards the target or back to the start
+        to_target = (state == MOVING_TO_TARGET) & active
+        moving = to_target | ((state == MOVING_TO_START) & active)
+        if moving.any():
+            goal_x = np.where(to_target, self.x_end, self.x_start)[moving]
+            goal_y = np.where(to_target, self.y_end, self.y_start)[moving]
+            speed_x = self.speed_x[moving]
+            speed_y = self.speed_y[moving]
+            prev_x = self.current_x[moving]
+            prev_y = self.current_y[moving]
+            new_x = prev_x + speed_x * dt
+            new_y = prev_y + speed_y * dt
+
+            # Check whether the goal point was reached on either axis
+            reached_x = ((speed_x > 0) & (new_x >= goal_x)) | ((speed_x < 0) & (new_x <= goal_x))
+            reached_y = ((speed_y > 0) & (new_y >= goal_y)) | ((speed_y < 0) & (new_y <= goal_y))
+            new_x = np.where(reached_x, goal_x, new_x)
+            new_y = np.where(reached_y, goal_y, new_y)
+            arrived = reached_x | reached_y
+            self.state[moving] = np.where(arrived, np.where(to_target[moving], WAITING_AT_TARGET, WAITING_AT_START),
+                                          state[moving])
+            timer = self.timer[moving]
+            timer[arrived] = 0
+            self.timer[moving] = timer
+
+            self.current_x[moving] = new_x
+            self.current_y[moving] = new_y
+            self.dx[moving] = new_x - prev_x
+            self.dy[moving] = new_y - prev_y
+
+        # Waiting at either end, then heading to the other one
+        waiting = ((state == WAITING_AT_TARGET) | (state == WAITING_AT_START)) & active
+        if waiting.any():
+            self.timer[waiting] += dt
+            done = waiting & (self.timer >= self.wait_time)
+            if done.any():
+                # Speeds of the next leg, only for the platforms leaving this tick
+                leave_target = done & (state == WAITING_AT_TARGET)
+                leave_start = done & (state == WAITING_AT_START)
+                self.state[leave_target] = MOVING_TO_START
+                self.state[leave_start] = MOVING_TO_TARGET
+                time_to_start = self.time_to_start[leave_target]
+                self.speed_x[leave_target] = leg_speed(self.x_start[leave_target] - self.x_end[leave_target],
+                                                       time_to_start, time_to_start != 0)
+                self.speed_y[leave_target] = leg_speed(self.y_start[leave_target] - self.y_end[leave_target],
+                                                       time_to_start, time_to_start != 0)
+                time_to_target = self.time_to_target[leave_start]
+                self.speed_x[leave_start] = leg_speed(self.x_end[leave_start] - self.x_start[leave_start],
+                                                      time_to_target, True)
+                self.speed_y[leave_start] = leg_speed(self.y_end[leave_start] - self.y_start[leave_start],
+                                                      time_to_target, self.time_to_start[leave_start] != 0)
+                self.timer[done] = 0
+
+        self.rect_x = round_pixels(self.current_x)
+        self.rect_y = round_pixels(self.current_y)
+
+        if self.broadphase is not None:
+            spans = self.cell_spans()
+            for index in np.nonzero((spans != self.spans).any(axis=1))[0].tolist():
+                self.broadphase.update(self.platforms[index], self.platforms[index].rect)
+            self.spans = spans
@@ -0,0 +1,193 @@
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+
+# Phases of a frame. core.Game reports the simulation ones, the frontend the rest.
+EVENT_PUMP = "event_pump"  # pygame events
+GAME_EVENTS = "game_events"  # The frontend reacting to the events of Game.step: music, level changes
+INPUT = "input"  # Game.step: buttons, mouse and timers
+MOVE = "move"  # GameObject.move of the player
+COLLISIONS = "collisions"  # Spikes, cup and the angry cursor
+PLATFORMS = "platforms"  # Moving platform update
+RENDER = "render"
+FLIP = "flip"  # display.flip or display.update
+PHASES = [EVENT_PUMP, GAME_EVENTS, INPUT, MOVE, COLLISIONS, PLATFORMS, RENDER, FLIP]
+FRAME = "frame"  # Whole frames, waiting for the frame rate cap included
+
+# Histogram buckets: HISTOGRAM_STEPS per doubling, from HISTOGRAM_MIN seconds up
+HISTOGRAM_MIN = 1e-6
+HISTOGRAM_STEPS = 8
+HISTOGRAM_BUCKETS = 24 * HISTOGRAM_STEPS  # Up to about 16 seconds
+PERCENTILES = [0.5, 0.95, 0.99]
+
+WINDOW_FRAMES = 240  # Frames the overlay looks back on
+OVERLAY_INTERVAL = 0.25  # Seconds between overlay redraws
+OVERLAY_COLOR = (0, 0, 0)
+OVERLAY_BACKGROUND = (255, 255, 255)
+
+
+# Wall time spent in each phase. Only one phase runs at a time: start() ends the running one.
+# Set it as core.Game.phase_timer to time the simulation, the game skips all of this without one.
+class PhaseTimer:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phase = None
+        self.started = 0.0
+        self.totals = {}
+        self.calls = {}
+
+    def start(self, phase):
+        now = self.clock()
+        if self.phase is not None:
+            self.add(self.phase, now - self.started)
+        self.phase = phase
+        self.started = now
+
+    def stop(self):
+        if self.phase is not None:
+            self.add(self.phase, self.clock() - self.started)
+            self.phase = None
+
+    def add(self, phase, seconds):
+        self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def reset(self):
+        self.phase = None
+        self.totals = {}
+        self.calls = {}
+
+    # Seconds and number of timed stretches per phase
+    def results(self):
+        return {phase: {"seconds": self.totals[phase], "calls": self.calls[phase]} for phase in self.totals}
+
+
+# Counts of durations in logarithmic buckets, percentiles are good to about 9%
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds > HISTOGRAM_MIN:
+            bucket = min(int(math.log2(seconds / HISTOGRAM_MIN) * HISTOGRAM_STEPS), HISTOGRAM_BUCKETS - 1)
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper edge of the bucket the fraction of all durations falls into
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(HISTOGRAM_MIN * 2 ** ((bucket + 1) / HISTOGRAM_STEPS), self.max)
+        return self.max
+
+
+# Times every phase of every frame. Each finished frame goes into a histogram per level and
+# phase for the whole session, and into a window of recent frames for the overlay.
+class FrameProfiler(PhaseTimer):
+    def __init__(self, clock=time.perf_counter):
+        super().__init__(clock)
+        self.histograms = {}  # (level, phase) -> Histogram
+        self.window = {phase: deque(maxlen=WINDOW_FRAMES) for phase in PHASES + [FRAME]}
+        self.frame_started = clock()
+        self.overlay = None
+        self.overlay_time = 0.0
+        self.font = None
+
+    def histogram(self, level, phase):
+        histogram = self.histograms.get((level, phase))
+        if histogram is None:
+            histogram = self.histograms[(level, phase)] = Histogram()
+        return histogram
+
+    def end_frame(self, level):
+        self.stop()
+        now = self.clock()
+        self.add(FRAME, now - self.frame_started)
+        self.frame_started = now
+        for phase in PHASES + [FRAME]:
+            seconds = self.totals.get(phase, 0.0)
+            self.window[phase].append(seconds)
+            # A phase that did not run (no tick this frame, a frozen frame not drawn) is no sample
+            if phase in self.totals:
+                self.histogram(level, phase).add(seconds)
+        self.totals = {}
+        self.calls = {}
+
+    # A new start, so the time the profiler was off does not count as one long frame
+    def restart(self):
+        self.reset()
+        self.frame_started = self.clock()
+        for window in self.window.values():
+            window.clear()
+
+    # Count, mean, max and percentiles in milliseconds, one row per level and phase
+    def summary(self):
+        rows = []
+        for (level, phase), histogram in sorted(self.histograms.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+            row = {
+                "level": level,
+                "phase": phase,
+                "frames": histogram.count,
+                "mean_ms": round(histogram.total / histogram.count * 1000, 4) if histogram.count else 0.0,
+                "max_ms": round(histogram.max * 1000, 4),
+            }
+            for fraction in PERCENTILES:
+                row[f"p{int(fraction * 100)}_ms"] = round(histogram.percentile(fraction) * 1000, 4)
+            rows.append(row)
+        return rows
+
+    # Write the summary to a .json or a .csv file
+    def dump(self, filename):
+        rows = self.summary()
+        temp_path = filename + ".tmp"
+        with open(temp_path, "w", newline="") as file:
+            if filename.endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else ["level", "phase"])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, file, indent=2)
+        os.replace(temp_path, filename)
+
+    # Frame rate and milliseconds per phase over the recent frames, redrawn a few times a second
+    def overlay_surface(self):
+        import pygame  # Only needed once the overlay is shown
+
+        now = self.clock()
+        if self.overlay is not None and now - self.overlay_time < OVERLAY_INTERVAL:
+            return self.overlay
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        frames = sorted(self.window[FRAME])
+        mean = sum(frames) / len(frames) if frames else 0.0
+        lines = [f"{1 / mean if mean else 0:.0f} FPS  frame {mean * 1000:.2f} ms"
+                 f"  p99 {frames[int(len(frames) * 0.99)] * 1000 if frames else 0:.2f} ms"]
+        for phase in PHASES:
+            values = self.window[phase]
+            lines.append(f"{phase:<11} {sum(values) / len(values) * 1000 if values else 0:.3f} ms")
+        images = [self.font.render(line, True, OVERLAY_COLOR, OVERLAY_BACKGROUND) for line in lines]
+        height = sum(image.get_height() for image in images)
+        surface = pygame.Surface((max(image.get_width() for image in images), height))
+        surface.fill(OVERLAY_BACKGROUND)
+        y = 0
+        for image in images:
+            surface.blit(image, (0, y))
+            y += image.get_height()
+        self.overlay = surface
+        self.overlay_time = now
+        return surface
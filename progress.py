@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+
+# Saved progress lives in memory, the game thread never waits for the disk. A writer thread
+# flushes it with write-to-temp-and-rename, so a crash leaves either the old or the new file.
+# Saves that come close together (level completed, then the next level loaded) become one write.
+
+PROGRESS_FILE = "game_progression.txt"  # The level to start at, a plain number as always
+TIMES_FILE = "level_times.json"  # Best and last completion time per level
+WRITE_DELAY = 0.5  # Seconds to wait for more saves before writing
+
+
+def write_atomic(filename, text):
+    temp_path = filename + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, filename)
+
+
+class ProgressStore:
+    def __init__(self, progress_file=PROGRESS_FILE, times_file=TIMES_FILE, write_delay=WRITE_DELAY):
+        self.progress_file = progress_file
+        self.times_file = times_file
+        self.write_delay = write_delay
+        self.level_index, missing = self.read_level_index()
+        self.times = self.read_times()  # level index -> {"best", "last", "completions"}
+        self.condition = threading.Condition()
+        self.dirty = missing  # A missing progress file is written with level 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.writer, name="progress-writer", daemon=True)
+        self.thread.start()
+
+    def read_level_index(self):
+        try:
+            with open(self.progress_file, "r") as file:
+                return int(file.read().strip()), False
+        except FileNotFoundError:
+            return 0, True
+        except ValueError:
+            print(f"Error: '{self.progress_file}' is damaged, starting from the title screen.")
+            return 0, True
+
+    def read_times(self):
+        try:
+            with open(self.times_file, "r") as file:
+                return {int(level): entry for level, entry in json.load(file).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, AttributeError):
+            print(f"Error: '{self.times_file}' is damaged, level times start over.")
+            return {}
+
+    # Call with the condition held
+    def changed(self):
+        self.dirty = True
+        self.condition.notify()
+
+    def save_level(self, level_index):
+        with self.condition:
+            self.level_index = level_index
+            self.changed()
+
+    def record_time(self, level_index, seconds):
+        with self.condition:
+            entry = self.times.setdefault(level_index, {"best": seconds, "last": seconds, "completions": 0})
+            entry["best"] = min(entry["best"], seconds)
+            entry["last"] = seconds
+            entry["completions"] += 1
+            self.changed()
+
+    def best_time(self, level_index):
+        entry = self.times.get(level_index)
+        return entry["best"] if entry else None
+
+    def writer(self):
+        while True:
+            with self.condition:
+                while not self.dirty and not self.closed:
+                    self.condition.wait()
+                if not self.dirty:
+                    return
+                # More saves may follow right away, they go into the same write
+                deadline = time.monotonic() + self.write_delay
+                while not self.closed and time.monotonic() < deadline:
+                    self.condition.wait(deadline - time.monotonic())
+                self.dirty = False
+                level_index = self.level_index
+                times = json.dumps({str(level): entry for level, entry in sorted(self.times.items())}, indent=2)
+            try:
+                write_atomic(self.progress_file, str(level_index))
+                write_atomic(self.times_file, times)
+            except OSError as e:
+                print(f"Error saving progress: {e}")
+
+    # Write what is left and stop the writer
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
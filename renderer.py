@@ -0,0 +1,153 @@
+import math
+
+import numpy as np
+import pygame
+
+import core
+from assets import END_SCREEN, TITLE_SCREEN
+from chunks import ChunkedLayer
+from tilemap import tile_positions
+
+WHITE = (255, 255, 255)
+
+
+# Draw every static tile of a level once into a single surface.
+# The main loop then blits this one surface per frame instead of every tile.
+def build_static_layer(tilemap, tile_images, width, height, background=WHITE):
+    layer = pygame.Surface((width, height)).convert()
+    layer.fill(background)
+    layer.blits(tilemap.blits(tile_images), doreturn=False)
+    return layer
+
+
+# Paint the tile rows of a baked layer again after they were edited
+def redraw_rows(layer, tilemap, tile_images, first_row, last_row, background=WHITE):
+    top, bottom = tile_positions(np.array([first_row, last_row + 1]), tilemap.tile_size)
+    layer.fill(background, (0, int(top), layer.get_width(), int(bottom - top)))
+    region = (0, first_row, tilemap.width, last_row + 1)
+    layer.blits(tilemap.blits(tile_images, region), doreturn=False)
+
+
+# One surface for levels as wide as the screen, chunks built around the camera for wider ones
+def build_level_layer(tilemap, tile_images, width, height, executor=None, background=WHITE):
+    level_width, level_height = tile_positions(np.array([tilemap.width, tilemap.height]), tilemap.tile_size)
+    if level_width <= round(width):
+        return build_static_layer(tilemap, tile_images, width, max(height, level_height), background)
+    return ChunkedLayer(tilemap, tile_images, background, executor=executor)
+
+
+# Draws into screen. With a window the screen is an offscreen surface at the base resolution,
+# scaled up to the window once per frame (smooth or nearest neighbour).
+class Renderer:
+    def __init__(self, screen, dirty_rects=False, window=None, smooth=False):
+        self.screen = screen
+        self.dirty_rects = dirty_rects
+        self.window = window
+        self.smooth = smooth
+        self.background = None  # A level layer surface or a ChunkedLayer
+        self.offset = (0, 0)  # Level position at the top left corner of the screen
+        self.full_redraw = True
+        self.previous_rects = []
+        self.current_rects = []
+
+    # New level layer, the whole window has to be repainted once
+    def set_background(self, background):
+        self.background = background
+        self.full_redraw = True
+
+    # Used for level loads and the full screen title/end images
+    def request_full_redraw(self):
+        self.full_redraw = True
+
+    # offset is the camera, a frame from somewhere else repaints the whole screen
+    def begin_frame(self, offset=(0, 0)):
+        self.current_rects = []
+        if offset != self.offset:
+            self.offset = offset
+            self.full_redraw = True
+        chunked = isinstance(self.background, ChunkedLayer)
+        if chunked:
+            self.background.update(self.screen.get_rect().move(offset))
+        if self.full_redraw or not self.dirty_rects:
+            if chunked:
+                self.background.draw(self.screen, self.screen.get_rect(), offset)
+            else:
+                self.screen.blit(self.background, (-offset[0], -offset[1]))
+        else:
+            # Only restore the background under what was drawn last frame
+            for rect in self.previous_rects:
+                if chunked:
+                    self.background.draw(self.screen, rect, offset)
+                else:
+                    self.screen.blit(self.background, rect, rect.move(offset))
+
+    def draw(self, image, position):
+        rect = self.screen.blit(image, position)
+        self.current_rects.append(rect)
+        return rect
+
+    def end_frame(self):
+        if self.window is not None:
+            self.present()  # Scaling touches every window pixel anyway, dirty rects only save offscreen blits
+        elif self.full_redraw or not self.dirty_rects:
+            pygame.display.flip()
+        else:
+            # Old rects uncover the background, new rects show the sprites
+            pygame.display.update(self.previous_rects + self.current_rects)
+        self.previous_rects = self.current_rects
+        self.full_redraw = False
+
+    # Show the whole screen, for what was drawn on it directly
+    def present(self):
+        if self.window is not None:
+            if self.smooth:
+                pygame.transform.smoothscale(self.screen, self.window.get_size(), self.window)
+            else:
+                pygame.transform.scale(self.screen, self.window.get_size(), self.window)
+        pygame.display.flip()
+
+    # Window coordinates, e.g. of the mouse, to screen coordinates
+    def to_screen(self, position):
+        if self.window is None:
+            return position
+        return (position[0] * self.screen.get_width() // self.window.get_width(),
+                position[1] * self.screen.get_height() // self.window.get_height())
+
+
+# Frames are drawn between the previous tick and the current one
+def interpolate(previous, current, alpha):
+    return (math.floor(previous[0] + (current[0] - previous[0]) * alpha + 0.5),
+            math.floor(previous[1] + (current[1] - previous[1]) * alpha + 0.5))
+
+
+# One frame of a running game. alpha is how far the frame is between the last tick and the next one,
+# an attached cursor is drawn at mouse_position on the screen. renderer.end_frame() shows it.
+def draw_game(renderer, game, assets, alpha, mouse_position):
+    if game.level_index in (core.TITLE_LEVEL, core.END_LEVEL):
+        renderer.request_full_redraw()  # Title and end screens cover the whole window
+    camera_x, camera_y = interpolate(game.camera_previous, game.camera, alpha)
+    renderer.begin_frame((camera_x, camera_y))
+    platform_x, platform_y = game.platform_system.interpolated_positions(alpha)
+    for platform, x, y in zip(game.moving_platforms, platform_x.tolist(), platform_y.tolist()):
+        renderer.draw(platform.image, (x - camera_x, y - camera_y))
+    current_sprite = assets.sprites[game.current_sprite_index]
+    player_x, player_y = interpolate(game.player_previous, game.player.rect.topleft, alpha)
+    player_position = (player_x - camera_x, player_y - camera_y)
+    if game.facing_right or game.is_dead:
+        if game.level_index == core.END_LEVEL:
+            renderer.draw(assets.screen_image(END_SCREEN), (0, 0))
+        else:
+            renderer.draw(current_sprite, player_position)
+    else:
+        renderer.draw(assets.flipped_sprite(game.current_sprite_index), player_position)
+    if game.level_index == core.TITLE_LEVEL:
+        renderer.draw(assets.screen_image(TITLE_SCREEN), (0, 0))
+    if game.level_index == core.END_LEVEL:
+        renderer.draw(assets.screen_image(END_SCREEN), (0, 0))
+    # Draw the angry cursor, an attached cursor sits right on the mouse
+    cursor_rect = assets.cursor_image.get_rect()
+    if game.cursor_attached:
+        cursor_rect.center = mouse_position
+    else:
+        cursor_rect.center = (int(game.angry_cursor_x) - camera_x, int(game.angry_cursor_y) - camera_y)
+    renderer.draw(assets.cursor_image, cursor_rect)
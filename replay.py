@@ -0,0 +1,168 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import struct
+import sys
+import time
+
+import core
+from masks import collision_masks
+
+# Replay file: header, then one record per tick that had input.
+# The simulation is deterministic, so the inputs and the starting values are the whole run.
+REPLAY_EXTENSION = ".rpl"
+REPLAY_MAGIC = b"IWRP"
+REPLAY_VERSION = 2
+# magic, version, tick rate, level index, tile size, seed, mouse x, mouse y, ticks, records, final state digest, options
+# The level index is signed (level-1.txt ships). Older files could only hold indices that fit both ways.
+REPLAY_HEADER = struct.Struct("<4sHHidIiiII20sI")
+REPLAY_HEADER_V1 = struct.Struct("<4sHHidIiiII20s")  # Version 1 had no options
+PIXEL_SPIKES_OPTION = 1  # Spikes were tested with collision masks
+# tick, flags: bit 0 mouse moved, bit 1 quit, bits 2-7 number of button events
+RECORD = struct.Struct("<IB")
+MOUSE = struct.Struct("<ii")
+MOUSE_FLAG = 1
+QUIT_FLAG = 2
+MAX_BUTTON_EVENTS = 63
+
+# One byte per button event: action * 4 + button
+ACTIONS = [core.PRESS, core.RELEASE]
+BUTTONS = [core.LEFT, core.RIGHT, core.JUMP, core.START]
+
+
+class Replay:
+    def __init__(self, level_index, tile_size, mouse=(0, 0), seed=0, tick_rate=core.SIMULATION_RATE,
+                 pixel_spikes=False):
+        self.level_index = level_index
+        self.tile_size = tile_size
+        self.mouse = mouse  # Mouse position when the game started
+        self.seed = seed  # The game has no randomness yet, kept for when it does
+        self.tick_rate = tick_rate
+        self.pixel_spikes = pixel_spikes  # The game ran with masks.CollisionMasks
+        self.ticks = 0
+        self.inputs = {}  # tick -> core.Inputs, ticks without input are left out
+        self.digest = bytes(20)  # core.Game.state_digest() after the last tick
+
+    def inputs_at(self, tick):
+        return self.inputs.get(tick)
+
+
+# Collects the inputs of a running game, call record() right before every Game.step()
+class Recorder:
+    def __init__(self, level_index, tile_size, mouse=(0, 0), seed=0, pixel_spikes=False):
+        self.replay = Replay(level_index, tile_size, mouse, seed, pixel_spikes=pixel_spikes)
+
+    def record(self, inputs):
+        if inputs.buttons or inputs.mouse is not None or inputs.quit:
+            self.replay.inputs[self.replay.ticks] = inputs
+        self.replay.ticks += 1
+
+    def save(self, filename, game):
+        self.replay.digest = game.state_digest()
+        write_replay(filename, self.replay)
+
+
+def write_replay(filename, replay):
+    data = [REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, replay.tick_rate, replay.level_index, replay.tile_size,
+                               replay.seed, int(replay.mouse[0]), int(replay.mouse[1]), replay.ticks,
+                               len(replay.inputs), replay.digest, PIXEL_SPIKES_OPTION if replay.pixel_spikes else 0)]
+    for tick in sorted(replay.inputs):
+        inputs = replay.inputs[tick]
+        buttons = inputs.buttons[:MAX_BUTTON_EVENTS]  # More than that in one tick is not a human
+        flags = len(buttons) << 2
+        if inputs.mouse is not None:
+            flags |= MOUSE_FLAG
+        if inputs.quit:
+            flags |= QUIT_FLAG
+        data.append(RECORD.pack(tick, flags))
+        data.append(bytes(ACTIONS.index(action) * 4 + BUTTONS.index(button) for action, button in buttons))
+        if inputs.mouse is not None:
+            data.append(MOUSE.pack(int(inputs.mouse[0]), int(inputs.mouse[1])))
+    temp_path = filename + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(b"".join(data))
+    os.replace(temp_path, filename)
+
+
+def read_replay(filename):
+    with open(filename, "rb") as file:
+        data = file.read()
+    if len(data) < REPLAY_HEADER_V1.size:
+        raise ValueError(f"{filename}: not a replay file")
+    magic, version = struct.unpack_from("<4sH", data)
+    header = REPLAY_HEADER_V1 if version == 1 else REPLAY_HEADER
+    if magic != REPLAY_MAGIC or version not in (1, REPLAY_VERSION) or len(data) < header.size:
+        raise ValueError(f"{filename}: not a replay file of version {REPLAY_VERSION}")
+    (magic, version, tick_rate, level_index, tile_size, seed, mouse_x, mouse_y, ticks, records,
+     digest, *options) = header.unpack_from(data)
+    pixel_spikes = bool(options and options[0] & PIXEL_SPIKES_OPTION)
+    replay = Replay(level_index, tile_size, (mouse_x, mouse_y), seed, tick_rate, pixel_spikes)
+    replay.ticks = ticks
+    replay.digest = digest
+    offset = header.size
+    for _ in range(records):
+        tick, flags = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        count = flags >> 2
+        buttons = [(ACTIONS[code // 4], BUTTONS[code % 4]) for code in data[offset:offset + count]]
+        offset += count
+        mouse = None
+        if flags & MOUSE_FLAG:
+            mouse = MOUSE.unpack_from(data, offset)
+            offset += MOUSE.size
+        replay.inputs[tick] = core.Inputs(buttons, mouse, bool(flags & QUIT_FLAG))
+    return replay
+
+
+# Run a replay through a fresh game, as fast as possible or at the recorded tick rate.
+# on_event is called with (tick, event, value) for everything the game reports.
+def play(replay, realtime=False, folder=".", on_event=None):
+    if replay.tick_rate != core.SIMULATION_RATE:
+        raise ValueError(f"replay runs at {replay.tick_rate} ticks/s, the game at {core.SIMULATION_RATE}")
+
+    def load_level(filename):
+        return core.build_level(os.path.join(folder, filename), replay.tile_size)
+
+    spike_masks = collision_masks(replay.tile_size, folder) if replay.pixel_spikes else None
+    game = core.Game(replay.level_index, replay.tile_size, load_level, replay.mouse, spike_masks=spike_masks)
+    start = time.perf_counter()
+    for tick in range(replay.ticks):
+        if realtime:
+            delay = start + tick / replay.tick_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        for event, value in game.step(replay.inputs_at(tick)):
+            if on_event:
+                on_event(tick, event, value)
+    return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a recorded run back and check that it ends the same way.")
+    parser.add_argument("replay")
+    parser.add_argument("--realtime", action="store_true", help="play at the recorded speed")
+    parser.add_argument("--folder", default=".", help="folder with the levelN.txt files")
+    args = parser.parse_args()
+
+    def print_event(tick, event, value):
+        if event == core.LEVEL_COMPLETED:
+            print(f"tick {tick}: level completed in {value:.2f} seconds")
+        elif event == core.RESPAWN_STARTED:
+            print(f"tick {tick}: died")
+        elif event == core.LEVEL_LOADED:
+            print(f"tick {tick}: entered level {value}")
+
+    replay = read_replay(args.replay)
+    start = time.perf_counter()
+    game = play(replay, args.realtime, args.folder, print_event)
+    seconds = time.perf_counter() - start
+    print(f"level{replay.level_index}: {replay.ticks} ticks ({replay.ticks / replay.tick_rate:.1f} s of play) "
+          f"in {seconds:.2f} s")
+    if game.state_digest() != replay.digest:
+        print("Final state differs from the recording")
+        sys.exit(1)
+    print("Final state matches the recording")
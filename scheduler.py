@@ -0,0 +1,24 @@
+import heapq
+
+
+# Frame-driven timers. The main loop advances the scheduler every tick and due
+# callbacks run from there, so waiting never blocks the event pump.
+class Scheduler:
+    def __init__(self):
+        self.time = 0.0
+        self.timers = []  # Heap of (due time, sequence number, callback)
+        self.sequence = 0
+
+    # Run callback once, delay seconds from now
+    def after(self, delay, callback):
+        self.sequence += 1
+        heapq.heappush(self.timers, (self.time + delay, self.sequence, callback))
+
+    def clear(self):
+        self.timers.clear()
+
+    def update(self, dt):
+        self.time += dt
+        while self.timers and self.timers[0][0] <= self.time:
+            due, sequence, callback = heapq.heappop(self.timers)
+            callback()
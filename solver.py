@@ -0,0 +1,506 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import heapq
+import multiprocessing
+import re
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+import core
+import levels
+import replay
+import vecenv
+from platforms import PlatformSystem
+from tilemap import CUP, SOLID, SPIKE
+
+# Can a level be finished? Best-first search over everything the player can do, stepped
+# by vecenv.VecEnv, which follows the rules of core.Game at the base resolution. One search
+# step holds a set of buttons for MACRO_TICKS ticks. States are expanded in batches of the
+# same platform positions, so every batch sees the same moving platforms.
+# The cursor is left out: a real player keeps it calm by moving the mouse.
+
+MACRO_TICKS = 3
+# Held buttons of each search step: left, right, jump
+MACROS = np.array([
+    [False, False, False],
+    [True, False, False],
+    [False, True, False],
+    [False, False, True],
+    [True, False, True],
+    [False, True, True],
+])
+MACRO_NAMES = ["-", "L", "R", "J", "LJ", "RJ"]
+
+MAX_TICKS = 60 * core.SIMULATION_RATE  # Give up on levels that take longer than a minute
+MAX_STATES = 1000000
+BATCH_STATES = 256  # Most promising states taken from the queue at a time, per worker
+# Searches tried one after another: heuristic weight, share of the state budget used up by its end.
+# Above 1 the search heads for the cup rather than trying everything nearby first. A strong pull
+# is fastest on most levels but runs past platforms that have to be waited for.
+SEARCHES = [(10, 0.25), (30, 1.0)]
+PLATFORM_REACH = 24  # Tiles around the path of a platform where its position tells states apart
+MOUSE_NUDGE_TICKS = core.SIMULATION_RATE  # How often the witness replay moves the mouse
+
+# Search state columns, all whole numbers at the base resolution
+X, Y, Y_VELOCITY, ON_GROUND, PLATFORM, DIRECTION, HELD = range(7)
+STATE_SIZE = HELD + vecenv.ACTION_SIZE
+
+# Results
+SOLVABLE = "solvable"
+UNREACHABLE = "cup unreachable"  # Every reachable state was tried
+GAVE_UP = "search limit reached"
+NO_SPAWN = "no spawn"
+NO_CUP = "no cup"
+SPAWN_ON_SPIKES = "spawn on spikes"
+SCREEN = "title or end screen"
+
+LEVEL_FILE = re.compile(r"level(-?\d+)\.txt$")
+
+
+class Report:
+    def __init__(self, folder, level_index):
+        self.folder = folder
+        self.level_index = level_index
+        self.result = None
+        self.ticks = 0  # Searched ticks, the length of the witness for a solvable level
+        self.states = 0
+        self.seconds = 0.0
+        self.witness = []  # Search steps, indices into MACROS
+        self.verified = False  # The witness finished the level in core.Game too
+        self.replay = None  # The witness as a replay.Replay, played back by the check above
+
+    @property
+    def name(self):
+        return os.path.join(self.folder, core.level_filename(self.level_index))
+
+    def witness_text(self):
+        runs = []
+        for macro in self.witness:
+            if runs and runs[-1][0] == macro:
+                runs[-1][1] += MACRO_TICKS
+            else:
+                runs.append([macro, MACRO_TICKS])
+        return " ".join(f"{MACRO_NAMES[macro]}*{ticks}" for macro, ticks in runs)
+
+
+# Environments of the level the worker is searching, one per chunk size
+envs = {}
+
+
+def level_env(folder, level_index, num_envs):
+    key = (folder, level_index, num_envs)
+    if key not in envs:
+        if any(cached[:2] != key[:2] for cached in envs):
+            envs.clear()
+        envs[key] = vecenv.VecEnv(num_envs, [level_index], max_ticks=np.iinfo(np.int64).max, folder=folder,
+                                  shared_platforms=True, calm_cursor=True)
+    return envs[key]
+
+
+def read_states(env):
+    states = np.zeros((env.num_envs, STATE_SIZE), dtype=np.int64)
+    states[:, X] = env.x
+    states[:, Y] = env.y
+    states[:, Y_VELOCITY] = env.y_velocity
+    states[:, ON_GROUND] = env.on_ground
+    states[:, PLATFORM] = env.platform
+    states[:, DIRECTION] = env.direction
+    states[:, HELD:] = env.held
+    return states
+
+
+def write_states(env, states):
+    env.x[:] = states[:, X]
+    env.y[:] = states[:, Y]
+    env.y_velocity[:] = states[:, Y_VELOCITY]
+    env.on_ground[:] = states[:, ON_GROUND]
+    env.platform[:] = states[:, PLATFORM]
+    env.direction[:] = states[:, DIRECTION]
+    env.held[:] = states[:, HELD:]
+
+
+# Highest the player can get: a jump above the highest tile or platform
+def highest_point(env, platforms):
+    top = min([0] + (np.minimum(platforms.y_start, platforms.y_end) - platforms.height).tolist())
+    jump_height = int(-env.jump_velocity * (1 - env.jump_velocity) / 2 / env.gravity)
+    return int(top) - env.player_height - jump_height - env.tile_size
+
+
+# Value ranges of the state key fields in a level: (column, lowest value, number of values).
+# The player stays inside the level sideways, cannot get above the highest point, and is
+# dropped once falling below the bottom, which also bounds the speed.
+def key_fields(env, platforms, bottom):
+    highest = highest_point(env, platforms)
+    speed = int(np.sqrt(2 * env.gravity * (bottom - highest))) - int(env.jump_velocity) + 2
+    fields = [
+        (X, 0, int(env.level_width.max()) + 1),
+        (Y, highest - speed, int(bottom) - highest + 2 * speed + 1),
+        (Y_VELOCITY, -speed, 2 * speed + 1),
+        (ON_GROUND, 0, 2),
+        (PLATFORM, -1, platforms.count + 1),
+    ]
+    assert np.prod([float(count) for _, _, count in fields]) < 2 ** 63, "state keys do not fit 64 bits"
+    return fields
+
+
+# One number per state, for telling visited states apart. Every macro sets the walking
+# direction anew, so direction and held left and right do not matter. Holding jump is left
+# out too: a state with jump released can do everything the held one can, and jump again.
+def state_keys(states, fields):
+    key = np.zeros(len(states), dtype=np.int64)
+    for column, low, count in fields:
+        values = states[:, column] - low
+        assert ((values >= 0) & (values < count)).all(), "state outside the key ranges"
+        key = key * count + values
+    return key
+
+
+def platform_key(platform_state):
+    return b"".join(platform_state[name].tobytes() for name in ("current_x", "current_y", "state", "timer"))
+
+
+# Where each platform is, one row of numbers per platform
+def platform_rows(platform_state):
+    return np.stack([platform_state[name].astype(np.float64) for name in ("current_x", "current_y", "state", "timer")],
+                    axis=1)
+
+
+# Pixel boxes around the paths of the platforms, widened by PLATFORM_REACH:
+# a player outside all of them cannot meet a platform soon, whatever the time
+def reach_boxes(platforms):
+    reach = PLATFORM_REACH * platforms.tile_size
+    left = np.minimum(platforms.x_start, platforms.x_end) - platforms.widths - reach
+    right = np.maximum(platforms.x_start, platforms.x_end) + platforms.widths + reach
+    top = np.minimum(platforms.y_start, platforms.y_end) - 2 * platforms.height - reach
+    bottom = np.maximum(platforms.y_start, platforms.y_end) + 2 * platforms.height + reach
+    return left, top, right, bottom
+
+
+# Try every macro from every state of a chunk, runs in the pool.
+# Returns the new states, which of them are still playing and which reached the cup.
+def expand(task):
+    folder, level_index, platform_state, states = task
+    count = len(states) * len(MACROS)
+    size = 1
+    while size < len(states):
+        size *= 2
+    env = level_env(folder, level_index, size * len(MACROS))
+    env.platforms.load_state(platform_state)
+    rows = np.repeat(states, len(MACROS), axis=0)
+    rows = np.concatenate([rows, np.repeat(rows[:1], env.num_envs - count, axis=0)])
+    write_states(env, rows)
+    actions = np.tile(MACROS, (size, 1))
+    died = np.zeros(env.num_envs, dtype=bool)
+    completed = np.zeros(env.num_envs, dtype=bool)
+    for _ in range(MACRO_TICKS):
+        _, _, _, info = env.step(actions, auto_reset=False)
+        completed |= info["completed"] & ~died
+        died |= info["died"]
+    playing = ~died & ~completed
+    return read_states(env)[:count], playing[:count], completed[:count]
+
+
+# Steps from every cell of the level to the nearest cup, around solid tiles and spikes.
+# The level is open at the top: sky_rows empty rows are put above it, so a way over the
+# top counts, like in levels that are climbed out of and walked over.
+# Cells that are walled off get the longest distance there is.
+def cup_distances(level, sky_rows=0):
+    grid = np.concatenate([np.zeros((sky_rows, level.width), dtype=level.grid.dtype), level.grid])
+    height = len(grid)
+    blocked = SOLID[grid] | SPIKE[grid]
+    distances = np.full(grid.shape, -1, dtype=np.int64)
+    queue = deque()
+    for row, column in np.argwhere(CUP[grid]).tolist():
+        distances[row, column] = 0
+        queue.append((row, column))
+    while queue:
+        row, column = queue.popleft()
+        for next_row, next_column in ((row - 1, column), (row + 1, column), (row, column - 1), (row, column + 1)):
+            if (0 <= next_row < height and 0 <= next_column < level.width
+                    and distances[next_row, next_column] < 0 and not blocked[next_row, next_column]):
+                distances[next_row, next_column] = distances[row, column] + 1
+                queue.append((next_row, next_column))
+    distances[distances < 0] = height * level.width
+    return distances
+
+
+# Search one level. With a pool the frontier is split into chunks expanded by its workers.
+def solve_level(folder, level_index, max_ticks=MAX_TICKS, max_states=MAX_STATES, pool=None, workers=1):
+    start = time.perf_counter()
+    report = Report(folder, level_index)
+    level = levels.load_level(report.name)
+    if level_index in (core.TITLE_LEVEL, core.END_LEVEL):
+        report.result = SCREEN
+    elif level.spawn is None:
+        report.result = NO_SPAWN
+    else:
+        for weight, share in SEARCHES:
+            search(report, level, max_ticks, int(max_states * share), pool, workers, weight)
+            if report.result != GAVE_UP:
+                break
+        if report.result == SOLVABLE:
+            report.replay = witness_replay(report)
+            report.verified = completes_level(report.replay, folder)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def search(report, level, max_ticks, max_states, pool, workers, weight):
+    folder, level_index = report.folder, report.level_index
+    env = level_env(folder, level_index, len(MACROS))
+    env.reset()
+    if env.first_tile(env.spike, env.x, env.y)[0][0]:
+        report.result = SPAWN_ON_SPIKES
+        return
+    if not CUP[level.grid].any():
+        report.result = NO_CUP
+        return
+    # Nothing below this can be landed on, a player falling past it is gone
+    platforms = PlatformSystem(level.platform_data, env.tile_size)
+    bottom = max([level.height * env.tile_size] + (platforms.y_start + platforms.height).tolist())
+    sky_rows = -(highest_point(env, platforms) // env.tile_size)
+    distances = cup_distances(level, sky_rows) * env.tile_size
+    fields = key_fields(env, platforms, bottom)
+
+    # Platforms only depend on the time, timeline[step] is where they are at the start of a search step
+    platforms.update(0)
+    timeline = []
+    phases = {}  # Platform positions -> phase number, levels without platforms have one phase
+    step_phases = []
+
+    # Each platform on its own: its positions -> phase number, step_platforms[step] holds them all
+    platform_phases = [{} for _ in range(platforms.count)]
+    step_platforms = []
+
+    def add_step(platform_state):
+        timeline.append(platform_state)
+        step_phases.append(phases.setdefault(platform_key(platform_state), len(phases)))
+        step_platforms.append([seen.setdefault(row.tobytes(), len(seen))
+                               for seen, row in zip(platform_phases, platform_rows(platform_state))])
+
+    add_step(platforms.save_state())
+
+    def phase(steps):
+        while len(timeline) <= steps.max():
+            for _ in range(MACRO_TICKS):
+                platforms.update(core.FIXED_DT)
+            add_step(platforms.save_state())
+        return np.array(step_phases)[steps]
+
+    # Visited states are told apart by the phases of the platforms they can reach only. Far from
+    # every platform a spot is visited once, not once per platform phase: a level with a slow
+    # platform in one corner no longer multiplies the rest of the level by its period.
+    # The witness is still checked in core.Game.
+    left, top, right, bottom_edge = reach_boxes(platforms)
+    local_phases = {}  # Phases of the platforms in reach, -1 for the others -> number
+
+    def local_phase(states, steps):
+        if not platforms.count:
+            return np.zeros(len(states), dtype=np.int64)
+        near = ((states[:, X, None] + env.player_width > left) & (states[:, X, None] < right)
+                & (states[:, Y, None] + env.player_height > top) & (states[:, Y, None] < bottom_edge))
+        rows = np.where(near, np.array(step_platforms)[steps], -1)
+        unique, inverse = np.unique(rows, axis=0, return_inverse=True)
+        numbers = np.array([local_phases.setdefault(row.tobytes(), len(local_phases)) for row in unique])
+        return numbers[inverse.reshape(-1)]
+
+    # Ticks so far plus a guess of the ticks left: the way to the cup at walking speed
+    def priorities(states, steps):
+        rows = np.clip((states[:, Y] + env.player_height // 2) // env.tile_size + sky_rows, 0, len(distances) - 1)
+        columns = np.clip((states[:, X] + env.player_width // 2) // env.tile_size, 0, level.width - 1)
+        distance = distances[rows, columns]
+        return (steps * MACRO_TICKS + weight * distance / core.PLAYER_SPEED).tolist()
+
+    # Search tree: state, parent node, macro from the parent and search step of every node
+    node_states = [read_states(env)[0]]
+    node_parent = [-1]
+    node_macro = [-1]
+    node_step = [0]
+    visited = {}  # (local phase, state key) -> seen only with jump held
+    queues = {0: [(0.0, 0)]}  # Open nodes of each phase, best first
+    cut_off = False
+    while queues:
+        # The best nodes of the phase holding the best node, they all see the same platforms
+        current = min(queues, key=lambda number: queues[number][0])
+        queue = queues.pop(current)
+        batch = [heapq.heappop(queue)[1] for _ in range(min(len(queue), BATCH_STATES * workers))]
+        if queue:
+            queues[current] = queue
+        platform_state = timeline[node_step[batch[0]]]
+        chunks = [batch[index:index + BATCH_STATES] for index in range(0, len(batch), BATCH_STATES)]
+        tasks = [(folder, level_index, platform_state, np.array([node_states[node] for node in chunk]))
+                 for chunk in chunks]
+        results = pool.map(expand, tasks) if pool is not None and len(tasks) > 1 else list(map(expand, tasks))
+
+        for chunk, (states, playing, completed) in zip(chunks, results):
+            parents = np.repeat(chunk, len(MACROS))
+            macros = np.tile(np.arange(len(MACROS)), len(chunk))
+            steps = np.repeat([node_step[node] + 1 for node in chunk], len(MACROS))
+            report.ticks = max(report.ticks, int(steps.max()) * MACRO_TICKS)
+            if completed.any():
+                report.result = SOLVABLE
+                report.ticks = int(steps[completed.argmax()]) * MACRO_TICKS
+                witness = [int(macros[completed.argmax()])]
+                node = parents[completed.argmax()]
+                while node_parent[node] >= 0:
+                    witness.append(node_macro[node])
+                    node = node_parent[node]
+                report.witness = witness[::-1]
+                return
+
+            keep = playing & ~((states[:, Y] >= bottom) & (states[:, Y_VELOCITY] >= 0))
+            late = keep & (steps * MACRO_TICKS >= max_ticks)
+            cut_off |= bool(late.any())
+            keep &= ~late
+            keys = np.zeros(len(states), dtype=np.int64)
+            keys[keep] = state_keys(states[keep], fields)
+            child_phases = phase(steps)
+            seen_phases = local_phase(states, steps)
+            jump_held = states[:, HELD + vecenv.ACTION_JUMP].astype(bool)
+            order = np.lexsort((jump_held, keys, seen_phases))
+            order = order[keep[order]]
+            first = np.ones(len(order), dtype=bool)
+            # Jump released sorts first
+            first[1:] = (keys[order[1:]] != keys[order[:-1]]) | (seen_phases[order[1:]] != seen_phases[order[:-1]])
+            new = np.zeros(len(states), dtype=bool)
+            new[order[first]] = True
+            for index in np.nonzero(new)[0].tolist():
+                key = (int(seen_phases[index]), int(keys[index]))
+                held = bool(jump_held[index])
+                if key in visited and not (visited[key] and not held):
+                    new[index] = False
+                else:
+                    visited[key] = held
+
+            indices = np.nonzero(new)[0]
+            for node, index, priority in zip(range(len(node_states), len(node_states) + len(indices)),
+                                             indices.tolist(), priorities(states[indices], steps[indices])):
+                heapq.heappush(queues.setdefault(int(child_phases[index]), []), (priority, node))
+            node_states += list(states[indices])
+            node_parent += parents[indices].tolist()
+            node_macro += macros[indices].tolist()
+            node_step += steps[indices].tolist()
+            report.states += len(indices)
+        if report.states > max_states:
+            report.result = GAVE_UP
+            return
+    report.result = GAVE_UP if cut_off else UNREACHABLE
+
+
+# The witness as a recording the game can play back: buttons change between search steps,
+# and the mouse moves once a second so the cursor stays calm like the search assumed
+def witness_replay(report):
+    run = replay.Replay(report.level_index, core.BASE_TILE_SIZE)
+    held = [False] * vecenv.ACTION_SIZE
+    buttons = [core.LEFT, core.RIGHT, core.JUMP]
+    for macro in report.witness:
+        actions = MACROS[macro].tolist()
+        changes = [(core.RELEASE, button) for button, was, now in zip(buttons, held, actions) if was and not now]
+        changes += [(core.PRESS, button) for button, was, now in zip(buttons, held, actions) if now and not was]
+        held = actions
+        for tick in range(run.ticks, run.ticks + MACRO_TICKS):
+            mouse = run.mouse if tick and tick % MOUSE_NUDGE_TICKS == 0 else None
+            if changes or mouse is not None:
+                run.inputs[tick] = core.Inputs(changes, mouse)
+            changes = []
+        run.ticks += MACRO_TICKS
+    # A few more ticks so the game sees the cup
+    run.ticks += MACRO_TICKS
+    return run
+
+
+def completes_level(run, folder):
+    completed = []
+    game = replay.play(run, folder=folder,
+                       on_event=lambda tick, event, value: completed.append(event == core.LEVEL_COMPLETED))
+    run.digest = game.state_digest()
+    return any(completed)
+
+
+def solve_task(task):
+    return solve_level(*task)
+
+
+# Levels of every folder and file given: (folder, level index)
+def find_levels(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = [LEVEL_FILE.match(name) for name in os.listdir(path)]
+            found += sorted((path, int(match.group(1))) for match in matches if match)
+        else:
+            match = LEVEL_FILE.match(os.path.basename(path))
+            if not match:
+                raise ValueError(f"{path}: level files are called levelN.txt")
+            found.append((os.path.dirname(path) or ".", int(match.group(1))))
+    return found
+
+
+# Search all levels. Each worker takes whole levels while there are enough of them,
+# a single level is searched here with the workers sharing its frontier.
+def solve_levels(found, workers=None, max_ticks=MAX_TICKS, max_states=MAX_STATES):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for folder, level_index in found:
+            yield solve_level(folder, level_index, max_ticks, max_states)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        if len(found) > 1:
+            tasks = [(folder, level_index, max_ticks, max_states) for folder, level_index in found]
+            yield from pool.imap(solve_task, tasks)
+        else:
+            for folder, level_index in found:
+                yield solve_level(folder, level_index, max_ticks, max_states, pool, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that levels can be finished.",
+        epilog="Budget: with the default limits most shipped levels take about a second. level9 takes about "
+               "half a minute, and level11 ends undecided after about two minutes, so a pass over dist takes about "
+               "three minutes on one core. Raise --max-states to decide levels like level11.")
+    parser.add_argument("paths", nargs="*", default=["."], help="level files or folders with levelN.txt files")
+    parser.add_argument("--workers", type=int, default=None, help="processes, one per CPU by default")
+    parser.add_argument("--max-seconds", type=float, default=MAX_TICKS / core.SIMULATION_RATE,
+                        help="longest play time to search")
+    parser.add_argument("--max-states", type=int, default=MAX_STATES,
+                        help="states to try per level; levels with long platform rides can need more")
+    parser.add_argument("--replays", default=None, help="folder to save a replay of every solution in")
+    args = parser.parse_args()
+
+    try:
+        found = find_levels(args.paths)
+    except ValueError as error:
+        parser.error(str(error))
+
+    start = time.perf_counter()
+    failed = 0
+    for report in solve_levels(found, args.workers, int(args.max_seconds * core.SIMULATION_RATE), args.max_states):
+        line = f"{report.name}: {report.result}"
+        if report.result == SOLVABLE:
+            line += f" in {report.ticks / core.SIMULATION_RATE:.2f} s of play"
+            if not report.verified:
+                line += " (the game does not agree)"
+        elif report.result in (UNREACHABLE, GAVE_UP):
+            line += f" after {report.ticks / core.SIMULATION_RATE:.2f} s of play"
+        if report.result == GAVE_UP:
+            line += " (not proven unsolvable, raise --max-states or --max-seconds)"
+        print(f"{line}, {report.states} states, {report.seconds:.2f} s")
+        if report.result == SOLVABLE:
+            print(f"    {report.witness_text()}")
+            if args.replays:
+                os.makedirs(args.replays, exist_ok=True)
+                replay.write_replay(os.path.join(args.replays, f"level{report.level_index}{replay.REPLAY_EXTENSION}"),
+                                    report.replay)
+        if report.result not in (SOLVABLE, SCREEN) or (report.result == SOLVABLE and not report.verified):
+            failed += 1
+    print(f"{failed} levels with problems, {time.perf_counter() - start:.2f} s")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,80 @@
+import numpy as np
+import pygame
+
+# Tile codes stored in the level grid, the index of a character is its code
+TILE_CHARS = ".tgsdfewp"
+EMPTY = 0
+TILE_CODES = {char: code for code, char in enumerate(TILE_CHARS)}
+
+# Lookup tables indexed by tile code
+SOLID = np.array([char in "tgp" for char in TILE_CHARS])
+SPIKE = np.array([char in "sdfe" for char in TILE_CHARS])
+CUP = np.array([char == "w" for char in TILE_CHARS])
+
+# Byte value -> tile code, everything unknown (platform lines, digits, ...) is empty
+CHAR_TO_CODE = np.zeros(256, dtype=np.uint8)
+for char, code in TILE_CODES.items():
+    CHAR_TO_CODE[ord(char)] = code
+
+
+# Level text rows -> dense grid of tile codes, short rows are padded with empty tiles
+def grid_from_rows(rows):
+    width = max((len(row) for row in rows), default=0)
+    data = b"".join(row.encode("ascii", "replace").ljust(width, b".") for row in rows)
+    return CHAR_TO_CODE[np.frombuffer(data, dtype=np.uint8)].reshape(len(rows), width)
+
+
+# Pixel position of a tile edge, rounded the same way pygame.Rect rounds
+def tile_positions(indices, tile_size):
+    return np.floor(indices * tile_size + 0.5).astype(np.int64)
+
+
+# The static part of a level: a dense grid of tile codes instead of one sprite per tile
+class TileMap:
+    def __init__(self, grid, tile_size):
+        self.grid = grid
+        self.height, self.width = grid.shape
+        self.tile_size = tile_size
+        self.tile_px = int(tile_size)  # Tile images are scaled to int(TILE_SIZE)
+
+    # Range of cells a pixel span can touch, one cell of slack for the rounded tile edges
+    def cell_range(self, start, end, count):
+        first = max(int(start // self.tile_size) - 1, 0)
+        last = min(int((end - 1) // self.tile_size) + 1, count - 1)
+        return first, last
+
+    # Rects of the tiles that overlap rect, in level order (top row first).
+    # Only the cells under the rect are looked at, so the cost does not depend on the level size.
+    def collide(self, rect, table):
+        return [tile_rect for tile_rect, code in self.tile_hits(rect, table)]
+
+    # (rect, tile code) of the tiles that overlap rect, for tests that depend on the tile type
+    def tile_hits(self, rect, table):
+        first_column, last_column = self.cell_range(rect.left, rect.right, self.width)
+        first_row, last_row = self.cell_range(rect.top, rect.bottom, self.height)
+        if first_column > last_column or first_row > last_row:
+            return []
+        cells = self.grid[first_row:last_row + 1, first_column:last_column + 1]
+        rows, columns = np.nonzero(table[cells])
+        hits = []
+        for x, y, code in zip(tile_positions(columns + first_column, self.tile_size),
+                              tile_positions(rows + first_row, self.tile_size), cells[rows, columns].tolist()):
+            tile_rect = pygame.Rect(int(x), int(y), self.tile_px, self.tile_px)
+            if tile_rect.colliderect(rect):
+                hits.append((tile_rect, code))
+        return hits
+
+    def collides(self, rect, table):
+        return bool(self.collide(rect, table))
+
+    # (image, position) pairs for drawing every non-empty tile once, or only those in the cells
+    # region = (first_column, first_row, end_column, end_row) shifted by origin
+    def blits(self, tile_images, region=None, origin=(0, 0)):
+        images = [tile_images.get(char) for char in TILE_CHARS]
+        first_column, first_row, end_column, end_row = region or (0, 0, self.width, self.height)
+        grid = self.grid[first_row:end_row, first_column:end_column]
+        rows, columns = np.nonzero(grid)
+        codes = grid[rows, columns]
+        xs = tile_positions(columns + first_column, self.tile_size) - origin[0]
+        ys = tile_positions(rows + first_row, self.tile_size) - origin[1]
+        return [(images[code], (int(x), int(y))) for code, x, y in zip(codes, xs, ys) if images[code] is not None]
@@ -0,0 +1,363 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import time
+
+import numpy as np
+
+import core
+import levels
+from platforms import PlatformSystem, round_pixels
+from tilemap import CUP, EMPTY, SOLID, SPIKE
+
+# Many games of the same rules as core.Game, stepped together. Every per-game value
+# is one row of a NumPy array, platforms of all games share one PlatformSystem.
+# Everything runs at the base resolution, where tiles and player speeds are whole pixels.
+# An episode ends when the player dies, reaches the cup or runs out of time, and that
+# game starts over right away.
+
+# Columns of the action array, a set column means the button is held
+ACTION_LEFT = 0
+ACTION_RIGHT = 1
+ACTION_JUMP = 2
+ACTION_SIZE = 3
+
+# Observation columns, positions and speeds are in tiles
+OBSERVATION_NAMES = [
+    "x", "y", "y_velocity", "on_ground", "on_platform",
+    "cursor_dx", "cursor_dy", "cursor_angry", "cup_dx", "cup_dy",
+]
+OBSERVATION_SIZE = len(OBSERVATION_NAMES)
+
+COMPLETE_REWARD = 1.0
+DEATH_REWARD = -1.0
+PROGRESS_REWARD = 0.01  # Per tile the player got closer to the cup
+
+DEFAULT_LEVELS = list(range(1, 12))
+MAX_TICKS = 60 * core.SIMULATION_RATE
+
+
+# Cells of a fixed size window over every player's rect, (rows, columns, inside mask)
+def span_window(left, top, width, height, tile_size):
+    window_rows = (height - 1) // tile_size + 2
+    window_columns = (width - 1) // tile_size + 2
+    first_row = top // tile_size
+    first_column = left // tile_size
+    rows = first_row[:, None] + np.arange(window_rows)
+    columns = first_column[:, None] + np.arange(window_columns)
+    inside = (((rows <= ((top + height - 1) // tile_size)[:, None]))[:, :, None]
+              & (columns <= ((left + width - 1) // tile_size)[:, None])[:, None, :])
+    return rows, columns, inside
+
+
+class VecEnv:
+    # shared_platforms gives every game the same platforms of a single level, they are moved once per
+    # step for all games and any reset starts them over. calm_cursor keeps the cursor from getting angry,
+    # as if the player kept moving the mouse.
+    def __init__(self, num_envs, level_indices=DEFAULT_LEVELS, max_ticks=MAX_TICKS, folder=".", mouse=(0, 0),
+                 shared_platforms=False, calm_cursor=False):
+        self.num_envs = num_envs
+        self.max_ticks = max_ticks
+        self.mouse = mouse
+        tile_size = self.tile_size = core.BASE_TILE_SIZE
+        self.width = core.SCREEN_COLUMNS * tile_size
+        self.view_width = self.width
+        self.player_width, self.player_height = core.PLAYER_SIZE
+        self.cursor_width, self.cursor_height = core.CURSOR_SIZE
+
+        # Level tables, padded to a common size with empty tiles
+        self.level_indices = list(level_indices)
+        loaded = [levels.load_level(os.path.join(folder, core.level_filename(index))) for index in self.level_indices]
+        height = max(level.height for level in loaded)
+        width = max(level.width for level in loaded)
+        grids = np.full((len(loaded), height, width), EMPTY, dtype=np.uint8)
+        for index, level in enumerate(loaded):
+            grids[index, :level.height, :level.width] = level.grid
+        self.solid = SOLID[grids]
+        self.spike = SPIKE[grids]
+        self.cup = CUP[grids]
+        # Walkable width of each level and the largest camera position in it, as in core.Game
+        self.level_width = np.array([max(self.width, level.width * tile_size) for level in loaded], dtype=np.int64)
+        self.max_camera_x = np.maximum(self.level_width - self.view_width, 0)
+        spawns = [level.spawn or (0, 0) for level in loaded]
+        self.spawn_x = np.array([column * tile_size for column, row in spawns], dtype=np.int64)
+        self.spawn_y = np.array([row * tile_size - self.player_height for column, row in spawns], dtype=np.int64)
+        # First cup of each level, the player itself when there is none
+        cups = [np.argwhere(level_cup) for level_cup in self.cup]
+        self.cup_x = np.array([(cup[0][1] + 0.5) * tile_size if len(cup) else np.nan for cup in cups])
+        self.cup_y = np.array([(cup[0][0] + 0.5) * tile_size if len(cup) else np.nan for cup in cups])
+        calm = [calm_cursor or index in (core.TITLE_LEVEL, core.END_LEVEL) for index in self.level_indices]
+        self.inactivity_threshold = np.where(calm, core.CALM_CURSOR_THRESHOLD, core.MOUSE_INACTIVITY_THRESHOLD)
+        self.title = np.array([index == core.TITLE_LEVEL for index in self.level_indices])
+
+        # Games take the levels in turn
+        self.level = np.arange(num_envs) % len(loaded)
+
+        # Platform rows of game i are platform_rows[i, :count], padded with -1
+        if shared_platforms:
+            if len(loaded) != 1:
+                raise ValueError("shared platforms need a single level")
+            platform_data = loaded[0].platform_data
+            self.platform_rows = np.tile(np.arange(len(platform_data), dtype=np.int64), (num_envs, 1))
+            self.platform_env = None
+        else:
+            platform_data = []
+            counts = [len(loaded[level].platform_data) for level in self.level]
+            self.platform_rows = np.full((num_envs, max(counts, default=0)), -1, dtype=np.int64)
+            for env, level in enumerate(self.level):
+                start = len(platform_data)
+                platform_data += loaded[level].platform_data
+                self.platform_rows[env, :counts[env]] = np.arange(start, len(platform_data))
+            self.platform_env = np.repeat(np.arange(num_envs), counts)
+        self.platforms = PlatformSystem(platform_data, tile_size)
+
+        # Player, cursor and episode state, one row per game
+        self.x = np.zeros(num_envs, dtype=np.int64)
+        self.y = np.zeros(num_envs, dtype=np.int64)
+        self.y_velocity = np.zeros(num_envs)
+        self.on_ground = np.zeros(num_envs, dtype=bool)
+        self.platform = np.full(num_envs, -1, dtype=np.int64)  # Platform row the player rides
+        self.direction = np.zeros(num_envs, dtype=np.int64)  # -1 left, 1 right
+        self.held = np.zeros((num_envs, ACTION_SIZE), dtype=bool)
+        self.cursor_x = np.zeros(num_envs)
+        self.cursor_y = np.zeros(num_envs)
+        self.cursor_attached = np.ones(num_envs, dtype=bool)
+        self.mouse_inactivity_timer = np.zeros(num_envs)
+        self.ticks = np.zeros(num_envs, dtype=np.int64)
+        self.cup_distance = np.zeros(num_envs)
+
+        self.player_speed = float(core.PLAYER_SPEED)
+        self.gravity = float(core.GRAVITY)
+        self.jump_velocity = float(core.JUMP_VELOCITY)
+        self.cursor_speed = float(core.CURSOR_SPEED)
+
+        self.steps = 0
+        self.step_seconds = 0.0
+        self.reset()
+
+    # Start the games in the boolean mask envs over, all of them by default. Returns the observations.
+    def reset(self, envs=None):
+        if envs is None:
+            envs = np.ones(self.num_envs, dtype=bool)
+        level = self.level[envs]
+        self.x[envs] = self.spawn_x[level]
+        self.y[envs] = self.spawn_y[level]
+        self.y_velocity[envs] = 0
+        self.on_ground[envs] = False
+        self.platform[envs] = -1
+        self.direction[envs] = 0
+        self.held[envs] = False
+        mouse_x, mouse_y = self.mouse_in_level()
+        self.cursor_x[envs], self.cursor_y[envs] = mouse_x[envs], mouse_y[envs]
+        self.cursor_attached[envs] = True
+        self.mouse_inactivity_timer[envs] = 0
+        self.ticks[envs] = 0
+        rows = None if self.platform_env is None else envs[self.platform_env]
+        self.platforms.reset(rows)
+        self.platforms.update(0, rows)
+        self.cup_distance[envs] = self.distance_to_cup()[envs]
+        return self.observations()
+
+    # Where the mouse points in each level: the camera centers the player and stays inside the level
+    def mouse_in_level(self):
+        camera_x = np.clip(self.x + self.player_width // 2 - self.view_width // 2, 0, self.max_camera_x[self.level])
+        return self.mouse[0] + camera_x, np.full(self.num_envs, self.mouse[1])
+
+    def distance_to_cup(self):
+        level = self.level
+        dx = self.cup_x[level] - (self.x + self.player_width / 2)
+        dy = self.cup_y[level] - (self.y + self.player_height / 2)
+        return np.nan_to_num(np.sqrt(dx * dx + dy * dy)) / self.tile_size
+
+    def observations(self):
+        level = self.level
+        center_x = self.x + self.player_width / 2
+        center_y = self.y + self.player_height / 2
+        observations = np.stack([
+            self.x, self.y, self.y_velocity, self.on_ground, self.platform >= 0,
+            self.cursor_x - center_x, self.cursor_y - center_y, ~self.cursor_attached,
+            np.nan_to_num(self.cup_x[level] - center_x), np.nan_to_num(self.cup_y[level] - center_y),
+        ], axis=1).astype(np.float32)
+        observations[:, [0, 1, 2, 5, 6, 8, 9]] /= self.tile_size
+        return observations
+
+    # First cell in level order under each rect where table is set: found, row, column
+    def first_tile(self, table, left, top):
+        rows, columns, inside = span_window(left, top, self.player_width, self.player_height, self.tile_size)
+        _, height, width = table.shape
+        inside = (inside & ((rows >= 0) & (rows < height))[:, :, None]
+                  & ((columns >= 0) & (columns < width))[:, None, :])
+        cells = table[self.level[:, None, None], np.clip(rows, 0, height - 1)[:, :, None],
+                      np.clip(columns, 0, width - 1)[:, None, :]] & inside
+        cells = cells.reshape(self.num_envs, -1)
+        found = cells.any(axis=1)
+        first = cells.argmax(axis=1)
+        index = np.arange(self.num_envs)
+        window_columns = columns.shape[1]
+        return found, rows[index, first // window_columns], columns[index, first % window_columns]
+
+    # The solid thing core.GameObject.move pushes the player out of: moving platforms
+    # first, then tiles from the top row down. Returns found, left, top, right, bottom, platform row.
+    def first_collider(self, left, top):
+        right = left + self.player_width
+        bottom = top + self.player_height
+        platform = np.full(self.num_envs, -1, dtype=np.int64)
+        platform_found = np.zeros(self.num_envs, dtype=bool)
+        if self.platform_rows.shape[1]:
+            rows = self.platform_rows
+            valid = rows >= 0
+            rows = np.where(valid, rows, 0)
+            platform_left = self.platforms.rect_x[rows]
+            platform_top = self.platforms.rect_y[rows]
+            platform_right = platform_left + self.platforms.widths[rows]
+            platform_bottom = platform_top + self.platforms.height
+            overlap = (valid & (left[:, None] < platform_right) & (right[:, None] > platform_left)
+                       & (top[:, None] < platform_bottom) & (bottom[:, None] > platform_top))
+            platform_found = overlap.any(axis=1)
+            platform = np.where(platform_found, rows[np.arange(self.num_envs), overlap.argmax(axis=1)], -1)
+        tile_found, tile_row, tile_column = self.first_tile(self.solid, left, top)
+        collider_left = tile_column * self.tile_size
+        collider_top = tile_row * self.tile_size
+        collider_right = collider_left + self.tile_size
+        collider_bottom = collider_top + self.tile_size
+        if platform_found.any():
+            rows = platform[platform_found]
+            collider_left[platform_found] = self.platforms.rect_x[rows]
+            collider_top[platform_found] = self.platforms.rect_y[rows]
+            collider_right[platform_found] = self.platforms.rect_x[rows] + self.platforms.widths[rows]
+            collider_bottom[platform_found] = self.platforms.rect_y[rows] + self.platforms.height
+        return (platform_found | tile_found, collider_left, collider_top, collider_right, collider_bottom,
+                platform)
+
+    # Turn held buttons into presses and releases the way core.Game reads them:
+    # releases of left and right first, then presses of left, right and jump
+    def apply_actions(self, actions):
+        held = self.held
+        can_walk = ~self.title[self.level]
+        released_left = held[:, ACTION_LEFT] & ~actions[:, ACTION_LEFT]
+        released_right = held[:, ACTION_RIGHT] & ~actions[:, ACTION_RIGHT]
+        pressed_left = ~held[:, ACTION_LEFT] & actions[:, ACTION_LEFT]
+        pressed_right = ~held[:, ACTION_RIGHT] & actions[:, ACTION_RIGHT]
+        pressed_jump = ~held[:, ACTION_JUMP] & actions[:, ACTION_JUMP]
+        self.direction[released_right & can_walk & (self.direction == 1)] = 0
+        self.direction[released_left & can_walk & (self.direction == -1)] = 0
+        self.direction[pressed_left & can_walk] = -1
+        self.direction[pressed_right & can_walk] = 1
+        jumping = pressed_jump & self.on_ground
+        self.y_velocity[jumping] = self.jump_velocity
+        self.on_ground[jumping] = False
+        self.platform[jumping] = -1  # Detach from platform on jump
+        self.held = actions.copy()
+
+    # Advance every game by one tick. actions is a (num_envs, ACTION_SIZE) boolean array.
+    # Returns observations, rewards, dones and an info dict of per-game arrays.
+    # Without auto_reset finished games keep running and it is up to the caller to reset them.
+    def step(self, actions, auto_reset=True):
+        start = time.perf_counter()
+        actions = np.asarray(actions, dtype=bool).reshape(self.num_envs, ACTION_SIZE)
+        self.apply_actions(actions)
+        self.ticks += 1
+
+        # Walking, jumping and gravity. is_jumping of core.Game is only cleared by dying,
+        # which ends the episode here, so the velocity always applies.
+        dx = self.direction * self.player_speed
+        dy = self.y_velocity.copy()
+        self.y_velocity += self.gravity
+
+        # X-axis movement
+        moved_x = round_pixels(self.x + dx)
+        found, left, top, right, bottom, _ = self.first_collider(moved_x, self.y)
+        self.x = np.where(found & (dx > 0), left - self.player_width, np.where(found & (dx < 0), right, moved_x))
+
+        # Y-axis movement
+        moved_y = round_pixels(self.y + dy)
+        found, left, top, right, bottom, platform = self.first_collider(self.x, moved_y)
+        landed = found & (dy > 0)
+        bumped = found & (dy < 0)
+        self.y = np.where(landed, top - self.player_height, np.where(bumped, bottom, moved_y))
+        self.on_ground |= landed
+        self.y_velocity[landed | bumped] = 0
+        attach = landed & (platform >= 0)
+        self.platform[attach] = platform[attach]
+
+        # Riding a platform, it keeps its momentum until the next jump
+        riding = self.platform >= 0
+        if riding.any():
+            rows = self.platform[riding]
+            self.x[riding] = round_pixels(self.x[riding] + self.platforms.dx[rows])
+            self.y[riding] = round_pixels(self.y[riding] + self.platforms.dy[rows])
+            self.on_ground[riding] = True
+
+        # Limit player movement within level bounds
+        self.x = np.clip(self.x, 0, self.level_width[self.level] - self.player_width)
+
+        died, _, _ = self.first_tile(self.spike, self.x, self.y)
+        completed, _, _ = self.first_tile(self.cup, self.x, self.y)
+        completed &= ~died
+
+        # Angry cursor, the mouse never moves here
+        playing = ~died & ~completed
+        self.mouse_inactivity_timer[playing] += core.FIXED_DT
+        angry = playing & (self.mouse_inactivity_timer >= self.inactivity_threshold[self.level])
+        self.cursor_attached[angry] = False
+        dir_x = self.x + self.player_width // 2 - self.cursor_x
+        dir_y = self.y + self.player_height // 2 - self.cursor_y
+        distance = np.sqrt(dir_x**2 + dir_y**2)
+        chasing = angry & (distance > 0)
+        self.cursor_x[chasing] += dir_x[chasing] / distance[chasing] * self.cursor_speed
+        self.cursor_y[chasing] += dir_y[chasing] / distance[chasing] * self.cursor_speed
+        cursor_left = np.trunc(self.cursor_x).astype(np.int64) - self.cursor_width // 2
+        cursor_top = np.trunc(self.cursor_y).astype(np.int64) - self.cursor_height // 2
+        caught = angry & ((self.x < cursor_left + self.cursor_width) & (self.x + self.player_width > cursor_left)
+                          & (self.y < cursor_top + self.cursor_height) & (self.y + self.player_height > cursor_top))
+        died |= caught
+        following = playing & ~angry & self.cursor_attached
+        mouse_x, mouse_y = self.mouse_in_level()
+        self.cursor_x[following], self.cursor_y[following] = mouse_x[following], mouse_y[following]
+
+        self.platforms.update(core.FIXED_DT)
+
+        distance = self.distance_to_cup()
+        rewards = (self.cup_distance - distance) * PROGRESS_REWARD
+        rewards[completed] += COMPLETE_REWARD
+        rewards[died] += DEATH_REWARD
+        self.cup_distance = distance
+        truncated = (self.ticks >= self.max_ticks) & ~died & ~completed
+        dones = died | completed | truncated
+        info = {"died": died, "completed": completed, "truncated": truncated,
+                "ticks": self.ticks.copy(), "final_observations": self.observations()}
+        observations = self.reset(dones) if auto_reset and dones.any() else info["final_observations"]
+
+        self.steps += self.num_envs
+        self.step_seconds += time.perf_counter() - start
+        return observations, rewards.astype(np.float32), dones, info
+
+    # Game ticks simulated per second of step() time, over all games
+    def steps_per_second(self):
+        return self.steps / self.step_seconds if self.step_seconds else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step many games with random input and report the step rate.")
+    parser.add_argument("levels", nargs="*", type=int, default=DEFAULT_LEVELS)
+    parser.add_argument("--envs", type=int, default=256)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", default=".", help="folder with the levelN.txt files")
+    args = parser.parse_args()
+    env = VecEnv(args.envs, args.levels, folder=args.folder)
+    rng = np.random.default_rng(args.seed)
+    actions = np.zeros((args.envs, ACTION_SIZE), dtype=bool)
+    episodes = completed = 0
+    for _ in range(args.ticks):
+        flip = rng.random((args.envs, ACTION_SIZE)) < 0.05
+        actions ^= flip
+        observations, rewards, dones, info = env.step(actions)
+        episodes += int(dones.sum())
+        completed += int(info["completed"].sum())
+    print(f"{args.envs} games x {args.ticks} ticks: {env.steps_per_second():.0f} game ticks/s, "
+          f"{episodes} episodes, {completed} completed")